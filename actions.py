@@ -0,0 +1,175 @@
+"""
+    This module sends all mouse and keyboard input to the game. Cursor
+    moves are queued and only sent when something depends on them, and
+    every tween and pause comes from a single speed profile
+    """
+import os
+from timeit import default_timer as timer
+import input_backends
+from frame_cache import FRAMES
+
+# Seconds for cursor tweens, drags, and the pause after every event. The
+# safe profile keeps the original timings, the faster ones are opt-in
+PROFILES = {
+    'safe': {'tween': 0.15, 'drag': 2, 'pause': 0.1},
+    'normal': {'tween': 0.08, 'drag': 0.5, 'pause': 0.03},
+    'fast': {'tween': 0.03, 'drag': 0.25, 'pause': 0.0},
+}
+SPEED_PROFILE = os.environ.get('GAME_AI_SPEED', 'safe')
+
+# Cursor position that doesn't obstruct template matching
+NEUTRAL = (400, 400)
+
+
+class Preempted(Exception):
+    """
+        Raised instead of sending input once the preemption event is set,
+        abandoning the current task so the control loop can handle it
+        """
+
+
+class InputQueue:
+    """
+        Queues input actions and sends them in order. A queued cursor move
+        is replaced by the next one and dropped if the cursor is already
+        there. The queue is flushed by any click, drag or key press and
+        before every screenshot
+        """
+
+    def __init__(self, profile=SPEED_PROFILE):
+        self.queue = []
+        self.profile = None
+        self.set_profile(profile)
+
+        # Event that interrupts the current task when set, e.g. a macro challenge
+        self.preemption = None
+
+        # Wall time spent sending input, per task
+        self.task = None
+        self.timings = dict()
+
+    def set_profile(self, name):
+        """
+            Apply a named speed profile to every following action
+            """
+        self.profile = PROFILES[name]
+
+    def cursor(self):
+        """
+            Returns where the cursor will be once the queue is sent
+            """
+        for action in reversed(self.queue):
+            if action[0] in ('move', 'jump'):
+                return action[1], action[2]
+        return input_backends.get_backend().position()
+
+    def move_to(self, x, y):
+        """
+            Queue a tweened cursor move, e.g. to hover over an element
+            """
+        self.queue_move(('move', x, y))
+
+    def neutral(self):
+        """
+            Queue an instant move to the neutral position
+            """
+        self.queue_move(('jump',) + NEUTRAL)
+
+    def queue_move(self, action):
+        """
+            Queue a cursor move in place of any move still queued
+            """
+        if self.queue and self.queue[-1][0] in ('move', 'jump'):
+            self.queue.pop()
+        if tuple(input_backends.get_backend().position()) == action[1:] and not self.queue:
+            return
+        self.queue.append(action)
+
+    def click(self, x=None, y=None):
+        """
+            Click, at a position if one is given
+            """
+        if x is not None:
+            self.move_to(x, y)
+        self.queue.append(('click',))
+        self.flush()
+
+    def double_click(self, x=None, y=None):
+        """
+            Double click, at a position if one is given
+            """
+        if x is not None:
+            self.move_to(x, y)
+        self.queue.append(('doubleClick',))
+        self.flush()
+
+    def drag(self, move_from, move_to, slow=False):
+        """
+            Drag from one position to another. Slow drags take the safe
+            profile's time
+            """
+        self.move_to(*move_from)
+        duration = PROFILES['safe']['drag'] if slow else self.profile['drag']
+        self.queue.append(('drag', move_to[0], move_to[1], duration))
+        self.flush()
+
+    def press(self, key):
+        """
+            Press and release a key
+            """
+        self.queue.append(('press', key))
+        self.flush()
+
+    def hotkey(self, *keys):
+        """
+            Press a key combination
+            """
+        self.queue.append(('hotkey',) + keys)
+        self.flush()
+
+    def flush(self):
+        """
+            Send every queued action to the game. Raises Preempted instead
+            while the preemption event is set, which also stops waits on
+            the screen since every screenshot flushes first
+            """
+        if self.preemption is not None and self.preemption.is_set():
+            self.queue = []
+            raise Preempted
+
+        if not self.queue:
+            return
+
+        start = timer()
+        backend = input_backends.get_backend()
+        queue, self.queue = self.queue, []
+        for action in queue:
+            if action[0] == 'move':
+                backend.move_to(action[1], action[2], self.profile['tween'])
+            elif action[0] == 'jump':
+                backend.move_to(action[1], action[2])
+            elif action[0] == 'click':
+                backend.click()
+            elif action[0] == 'doubleClick':
+                backend.double_click()
+            elif action[0] == 'drag':
+                backend.drag_to(action[1], action[2], action[3])
+            elif action[0] == 'press':
+                backend.press(action[1])
+            elif action[0] == 'hotkey':
+                backend.hotkey(*action[1:])
+            backend.pause(self.profile['pause'])
+
+        # What is on screen has changed
+        FRAMES.invalidate()
+
+        self.timings[self.task] = self.timings.get(self.task, 0) + timer() - start
+
+    def take_timing(self, task):
+        """
+            Returns the input time recorded for a task and resets it
+            """
+        return self.timings.pop(task, 0)
+
+
+INPUT = InputQueue()
@@ -2,103 +2,102 @@
     This module will find the shortest path between two points
     """
 from heapq import heappush, heappop
-import numpy as np
 from game_map import GameMap
 
 def heuristic(point_a, point_b):
     """
         Manhattan distance heuristic function. Used by the A* algorithm
         """
-    return (point_b[0] - point_a[0]) ** 2 + (point_b[1] - point_a[1]) ** 2
+    return abs(point_b[0] - point_a[0]) + abs(point_b[1] - point_a[1])
 
-def build_path(came_from, goal):
+def build_path(came_from, goal, width):
     """
-        Build the path based on the path found from the A* algorithm
+        Build the path based on the parent buffer filled by the A* algorithm.
+        The start, which has no parent, is not included
         """
-    path = [goal]
+    path = []
     current = goal
 
-    while current in came_from:
+    while came_from[current] != -1:
+        path.append(divmod(current, width))
         current = came_from[current]
-        path.insert(0, current)
-
-    # Remove the start from the path
-    path = path[1::]
 
+    path.reverse()
     return path
 
 def get_path(game_map, start, goal):
     """
         Implementation of the A* algorithm to find the shortest path
-        between two points in the map.
+        between two points in the map. Cells are numbered x * width + y so
+        scores, parents and the closed set live in flat buffers.
         """
-    np.set_printoptions(threshold=np.inf)
-    # The set of nodes already evaluated
-    closed_set = set()
+    height, width = game_map.shape
+    start_index = start[0] * width + start[1]
+    goal_index = goal[0] * width + goal[1]
 
-    # For each node, which node it can most efficiently be reached from.
-    # If a node can be reached from many nodes, came_from will eventually contain the
-    # most efficient previous step.
-    came_from = dict()
+    # Only allow cells with value less than inaccessible
+    passable = (game_map < GameMap.TILES.INACCESSIBLE.value).tobytes()
+
+    # The set of nodes already evaluated
+    closed = bytearray(height * width)
 
-    # For each node, the cost of getting from the start node to that node.
-    # The cost of going from start to start is zero.
-    g_score = {start: 0}
+    # For each node, which node it can most efficiently be reached from
+    came_from = [-1] * (height * width)
 
-    # For each node, the total cost of getting from the start node to the goal
-    # by passing by that node. That value is partly known, partly heuristic.
-    # For the first node, that value is completely heuristic.
-    f_score = {start: heuristic(start, goal)}
+    # For each node, the cost of getting from the start node to that node
+    unreached = height * width
+    g_score = [unreached] * (height * width)
+    g_score[start_index] = 0
 
-    # The set of currently discovered nodes that are not evaluated yet.
-    # Initially, only the start node is known.
-    open_heap = []
-    heappush(open_heap, (f_score[start], start))
+    # Discovered nodes ordered by f score, ties broken by the heuristic so
+    # nodes closer to the goal are expanded first. Improved nodes are pushed
+    # again and stale entries are skipped when popped
+    h_score = heuristic(start, goal)
+    open_heap = [(h_score, h_score, start_index)]
 
     while open_heap:
-        # Current it the node in openSet having the lowest f_score[] value
-        current = heappop(open_heap)[1]
+        current = heappop(open_heap)[2]
+
+        # Stale entry for a node that was already evaluated
+        if closed[current]:
+            continue
 
         # We have arrived at our destination
-        if current == goal:
-            return build_path(came_from, current)
+        if current == goal_index:
+            return build_path(came_from, current, width)
 
         # Mark this one as visited
-        closed_set.add(current)
-
-        # Find the neighbours of the current cell
-        neighbours = [(current[0], current[1]+1), (current[0], current[1]-1),
-                        (current[0] + 1, current[1]), (current[0]-1, current[1])]
+        closed[current] = 1
+        tentative_g_score = g_score[current] + 1
+        x, y = divmod(current, width)
+
+        # Find the neighbours of the current cell that exist
+        neighbours = []
+        if y + 1 < width:
+            neighbours.append(current + 1)
+        if y > 0:
+            neighbours.append(current - 1)
+        if x + 1 < height:
+            neighbours.append(current + width)
+        if x > 0:
+            neighbours.append(current - width)
 
-        # Go through each neightbor
         for neighbour in neighbours:
-            # Ignore the neighbour which is already evaluated.
-            if neighbour in closed_set:
-                continue
-
-            # Ignore neighbours that do not exist
-            dimensions = game_map.shape
-            if not 0 <= neighbour[0] < dimensions[0] or not 0 <= neighbour[1] < dimensions[1]:
+            # Ignore evaluated and blocked neighbours
+            if closed[neighbour] or not passable[neighbour]:
                 continue
 
-            # Only allow neighbours with value less than inaccessible
-            if game_map[neighbour] >= GameMap.TILES.INACCESSIBLE.value:
-                continue
-
-            # The distance from start to a neighbour
-            tentative_g_score = g_score[current] + 1
-
             # This is not a better path
-            if neighbour in g_score and tentative_g_score >= g_score[neighbour]:
+            if tentative_g_score >= g_score[neighbour]:
                 continue
 
+            # This path is the best until now. Record it!
             g_score[neighbour] = tentative_g_score
-            f_score[neighbour] = g_score[neighbour] + \
-                heuristic(neighbour, goal)
+            came_from[neighbour] = current
 
-            # Discover a new node
-            if neighbour not in open_heap:
-                heappush(open_heap, (f_score[neighbour], neighbour))
+            neighbour_x, neighbour_y = divmod(neighbour, width)
+            h_score = abs(goal[0] - neighbour_x) + abs(goal[1] - neighbour_y)
+            heappush(open_heap, (tentative_g_score + h_score, h_score, neighbour))
 
-            # This path is the best until now. Record it!
-            came_from[neighbour] = current
+    # No path exists
+    return None
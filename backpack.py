@@ -1,11 +1,35 @@
 """
     This module handles everything backpack related
     """
-import os
 import cv2
 import numpy as np
-import pyautogui
 import utilities as utils
+import templates
+from actions import INPUT
+
+
+class Inventory:
+    """
+        Every item found in the backpack in a single frame, as (x, y)
+        locations relative to the backpack, best match first
+        """
+
+    def __init__(self, frame, backpack_loc, items):
+        self.frame = frame
+        self.backpack_loc = backpack_loc
+        self.items = items
+
+    def locations(self, item):
+        """
+            Returns the locations of an item, empty if it was not found
+            """
+        return self.items.get(item, [])
+
+    def count(self, item):
+        """
+            Returns how many of an item were found
+            """
+        return len(self.locations(item))
 
 
 class Backpack:
@@ -28,15 +52,28 @@ class Backpack:
     # Free space = (70, 92)
     DAGGER_LOC = (96, 92)
 
+    # Where each item belongs: (item, destination, grab offset)
+    LAYOUT = (
+        ('ore', ORE_LOC, (8, 6)),
+        ('gem', GEM_LOC, (4, 2)),
+        ('jewel', GEM_LOC, (4, 2)),
+        ('galantine', GEM_LOC, (5, 4)),
+        ('pickaxe', PICKAXE_LOC, (9, 4)),
+        ('dagger', DAGGER_LOC, (4, 6)),
+        ('hammer', HAMMER_LOC, (7, 3)),
+        ('gold', GEM_LOC, (6, 5)),
+        ('ingot', INGOT_LOC, (5, 5)),
+    )
+
+    # Passes over the backpack before giving up on the remaining moves
+    ORGANIZE_ATTEMPTS = 3
+
     def __init__(self):
-        # Load all backpack item templates
-        self.item_templates = dict()
-        for item in os.listdir('./backpack_items'):
-            item_template = cv2.imread('./backpack_items/' + item)
-            self.item_templates[item.split('.')[0]] = item_template
+        # Inventory of the most recently scanned frame
+        self.inventory = None
 
-        # Load backpack template
-        self.backpack_template = cv2.imread('./ui_elements/backpack.png')
+        # Items in the backpack right after it was last organized
+        self.organized_items = None
 
     def get_backpack(self):
         """
@@ -45,7 +82,7 @@ class Backpack:
             """
         # Find backpack in screenshot
         screenshot = utils.take_screenshot(False)
-        result = cv2.matchTemplate(screenshot, self.backpack_template, cv2.TM_CCORR_NORMED)
+        result = utils.match_template(screenshot, 'ui_elements/backpack')
         _, max_val, _, backpack_loc = cv2.minMaxLoc(result)
 
         # Failed to find the backpack with high confidence
@@ -60,65 +97,182 @@ class Backpack:
 
         return (backpack, backpack_loc)
 
-    def move_item(self, item, move_to, offset=(5, 5)):
+    def scan(self):
+        """
+            Classify everything in the player's backpack in one pass over
+            the current frame. The inventory is reused until a new frame
+            is captured
+            """
+        screenshot = utils.take_screenshot(False)
+        if self.inventory is not None and self.inventory.frame is screenshot:
+            return self.inventory
+
+        backpack_loc = self.get_backpack()[1]
+        region = (backpack_loc[0], backpack_loc[1], 128, 144)
+
+        items = dict()
+        for name in templates.names('backpack_items'):
+            result = utils.match_template(screenshot, name, region)
+            locations = self.peaks(result)
+            if locations:
+                items[name.split('/')[1]] = locations
+
+        self.inventory = Inventory(screenshot, backpack_loc, items)
+        return self.inventory
+
+    @staticmethod
+    def peaks(result, threshold=0.9, radius=8):
+        """
+            Returns the (x, y) locations of distinct high confidence matches,
+            best first. Matches within radius pixels of a better one are the
+            same item
+            """
+        ys, xs = np.where(result >= threshold)
+        order = np.argsort(-result[ys, xs])
+
+        locations = []
+        for x, y in zip(xs[order].tolist(), ys[order].tolist()):
+            if all(abs(x - other[0]) > radius or abs(y - other[1]) > radius
+                   for other in locations):
+                locations.append((x, y))
+        return locations
+
+    def locations(self, item):
+        """
+            Returns the locations of an item in the backpack of the current
+            frame, relative to the backpack. Only the item's own template is
+            matched unless the frame was already scanned
+            """
+        screenshot = utils.take_screenshot(False)
+        if self.inventory is not None and self.inventory.frame is screenshot:
+            return self.inventory.locations(item)
+
+        name = 'backpack_items/' + item
+        if name not in templates.names('backpack_items'):
+            return []
+
+        backpack_loc = self.get_backpack()[1]
+        region = (backpack_loc[0], backpack_loc[1], 128, 144)
+        return self.peaks(utils.match_template(screenshot, name, region))
+
+    def count(self, item):
+        """
+            Returns how many of an item are visible in the backpack
+            """
+        return len(self.locations(item))
+
+    @staticmethod
+    def in_place(item_loc, move_to):
+        """
+            Checks if an item is already in the area around its destination
+            """
+        return move_to[0] - 12 < item_loc[0] < move_to[0] + 14 and \
+            move_to[1] - 12 < item_loc[1] < move_to[1] + 14
+
+    def plan_moves(self, inventory, layout):
+        """
+            Returns the (from, to) screen coordinates of every drag needed to
+            put the items of a layout in place, ordered so the cursor always
+            goes to the nearest item next
+            """
+        backpack_loc = inventory.backpack_loc
+        moves = []
+        for item, move_to, offset in layout:
+            for item_loc in inventory.locations(item):
+                # Skip items already in the correct area
+                if self.in_place(item_loc, move_to):
+                    continue
+                moves.append(((backpack_loc[0] + item_loc[0] + offset[0],
+                               backpack_loc[1] + item_loc[1] + offset[1]),
+                              (backpack_loc[0] + move_to[0], backpack_loc[1] + move_to[1])))
+
+        # Greedily pick the closest item to where the last drag ended
+        ordered = []
+        cursor = INPUT.cursor()
+        while moves:
+            closest = min(moves, key=lambda move: abs(move[0][0] - cursor[0]) + abs(move[0][1] - cursor[1]))
+            moves.remove(closest)
+            ordered.append(closest)
+            cursor = closest[1]
+        return ordered
+
+    def drag(self, moves, slow=False):
         """
-            Move an item to a different location in the backpack. The search
-            for the item will always exclude a 5 pixel margin around the
-            destination so the same item isn't moved repeatedly.
+            Drag and drop each item from and to the planned coordinates
+            """
+        for move_from, move_to in moves:
+            INPUT.drag(move_from, move_to, slow)
+
+    def organize(self, layout=LAYOUT):
+        """
+            Move every item of the layout to its area of the backpack. All
+            moves are planned from one scan, then a single rescan checks the
+            result and only the moves that failed are retried. Returns False
+            if some items could not be put in place
             """
         # Move mouse to a neutral position that won't obstruct template matching
-        pyautogui.moveTo(400, 400)
+        INPUT.neutral()
+        inventory = self.scan()
 
-        # Get the player's backpack
-        backpack, backpack_loc = self.get_backpack()
+        # Nothing has changed since the backpack was last organized
+        if inventory.items == self.organized_items:
+            return True
 
-        # Find all instances of the item in the backpack
-        res = cv2.matchTemplate(backpack, self.item_templates[item], cv2.TM_CCORR_NORMED)
+        slow = False
+        for _ in range(self.ORGANIZE_ATTEMPTS):
+            moves = self.plan_moves(inventory, layout)
+            if not moves:
+                self.organized_items = inventory.items
+                return True
 
-        # Only consider high confidence matches
-        threshold = 0.9
-        loc = np.where(res >= threshold)
+            # Moves that fail are retried with slow drags
+            self.drag(moves, slow)
+            slow = True
 
-        # For each match, move it if it isn't already in the correct area
-        for item_loc in zip(*loc[::-1]):
-            # Skip items already in the correct area
-            if move_to[0] - 12 < item_loc[0] < move_to[0] + 14 and move_to[1] - 12 < item_loc[1] < move_to[1] + 14:
-                continue
+            # Rescan to see which moves took
+            INPUT.neutral()
+            inventory = self.scan()
 
-            # Drag and drop the item to the correct area
-            pyautogui.moveTo((backpack_loc[0] + item_loc[0] + offset[0]),
-                             (backpack_loc[1] + item_loc[1] + offset[1]), 0.15)
-            pyautogui.dragTo((backpack_loc[0] + move_to[0]),
-                             (backpack_loc[1] + move_to[1]),
-                             2, pyautogui.easeOutQuad, button='left')
+        utils.log("WARN", F"{len(self.plan_moves(inventory, layout))} items could not be organized")
+        return False
 
+    def move_item(self, item, move_to, offset=(5, 5)):
+        """
+            Move an item to a different location in the backpack. Items
+            already within 12 pixels of the destination are left alone so
+            the same item isn't moved repeatedly.
+            """
         # Move mouse to a neutral position that won't obstruct template matching
-        pyautogui.moveTo(400, 400)
+        INPUT.neutral()
+
+        self.drag(self.plan_moves(self.scan(), ((item, move_to, offset),)), True)
+
+        # Move mouse to a neutral position that won't obstruct template matching
+        INPUT.neutral()
 
     def get_item(self, item, exit_on_failure=False):
         """
             Find an item in the player's backpack and return it's pixel coordinates
             """
-        # Get the player's backpack
-        backpack, backpack_loc = self.get_backpack()
-
-        # Search the backpack for the item
-        result = cv2.matchTemplate(backpack, self.item_templates[item], cv2.TM_CCORR_NORMED)
-        _, max_val, _, item_loc = cv2.minMaxLoc(result)
+        # Search the player's backpack for the item
+        locations = self.locations(item)
 
         # Failed to find item in backpack with high confidence
-        if max_val < 0.9:
+        if not locations:
             if exit_on_failure:
-                utils.log("SEVERE", F"Unable to find {item} in backpack. max_val: {max_val:3.2f}")
+                utils.log("SEVERE", F"Unable to find {item} in backpack")
                 utils.quit_game()
             else:
                 return False
 
+        item_loc = locations[0]
+        backpack_loc = self.get_backpack()[1]
         return (backpack_loc[0] + item_loc[0], backpack_loc[1] + item_loc[1])
 
     def use_item(self, item, use_at=None, offset=(6, 6), exit_on_failure=False):
         """
-            Find an item in the player's backpack, use it, and check/resolve any macro challenge
+            Find an item in the player's backpack and use it. A macro
+            challenge this triggers is resolved by the control loop
             """
         # Get the coordinates of the item
         item_loc = self.get_item(item, exit_on_failure)
@@ -127,19 +281,14 @@ class Backpack:
             return False
 
         # Double click on the item
-        pyautogui.moveTo((item_loc[0] + offset[0]), (item_loc[1] + offset[1]), 0.15)
-        pyautogui.doubleClick()
-
-        # Check if a macro challenge occurred
-        utils.resolve_macro_check()
+        INPUT.double_click((item_loc[0] + offset[0]), (item_loc[1] + offset[1]))
 
         if use_at is None:
             return True
 
         # Use the item
-        pyautogui.moveTo(use_at[0], use_at[1], 0.15)
-        pyautogui.click()
+        INPUT.click(use_at[0], use_at[1])
 
         # Move mouse to a neutral position that won't obstruct template matching
-        pyautogui.moveTo(400, 400)
+        INPUT.neutral()
         return True
@@ -0,0 +1,482 @@
+"""
+    Benchmarks for the perception hot paths. Run one with:
+        python benchmark.py tiles <screenshot.png>
+        python benchmark.py paths [map.npy]
+        python benchmark.py replan [map.npy]
+        python benchmark.py ocr <crops directory>
+        python benchmark.py capture
+        python benchmark.py input
+        python benchmark.py drive <replay directory>
+    """
+import os
+import sys
+import tempfile
+from heapq import heappush, heappop
+from timeit import default_timer as timer
+import numpy as np
+import cv2
+import pytesseract
+import utilities as utils
+import capture
+import input_backends
+import actions
+import glyphs
+import ocr
+import tile_index
+import astar
+from game_map import GameMap
+from move import Move
+from planner import Planner
+from map_store import MapStore
+from user_interface import UserInterface
+from backpack import Backpack
+from merchant import Merchant
+from frame_cache import FRAMES
+
+TILE_DIM = tile_index.TILE_DIM
+
+
+def linear_scan(play, tile_templates):
+    """
+        Classifies every tile in the play region with the original linear
+        scan over the templates
+        """
+    labels = []
+    for i in range(21):
+        for j in range(21):
+            tile = play[(j * TILE_DIM):((j + 1) * TILE_DIM), (i * TILE_DIM):((i + 1) * TILE_DIM)]
+            template = None
+            for potential_template in tile_templates:
+                if np.allclose(potential_template[0], tile, 1, 1):
+                    template = potential_template
+                    break
+            labels.append(None if template is None else template[1])
+    return labels
+
+
+def indexed_lookup(play, index):
+    """
+        Classifies every tile in the play region with the tile index
+        """
+    labels = []
+    for i in range(21):
+        for j in range(21):
+            tile = play[(j * TILE_DIM):((j + 1) * TILE_DIM), (i * TILE_DIM):((i + 1) * TILE_DIM)]
+            template = index.lookup(tile)
+            labels.append(None if template is None else template[1])
+    return labels
+
+
+def time_call(function, *args, repeat=10):
+    """
+        Returns the best wall time of a call in milliseconds and its result
+        """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = timer()
+        result = function(*args)
+        best = min(best, timer() - start)
+    return best * 1000, result
+
+
+def benchmark_tiles(screenshot_path):
+    """
+        Compares the tile index with the linear template scan on the play
+        region of a captured screenshot
+        """
+    screenshot = cv2.cvtColor(cv2.imread(screenshot_path), cv2.COLOR_BGR2GRAY)
+    play = screenshot[8:344, 8:344]
+    tile_templates = tile_index.load_templates()
+
+    linear_ms, expected = time_call(linear_scan, play, tile_templates)
+    cold_ms, _ = time_call(lambda: indexed_lookup(play, tile_index.TileIndex(tile_templates)))
+    index = tile_index.TileIndex(tile_templates)
+    warm_ms, labels = time_call(indexed_lookup, play, index)
+    grid_ms, grid = time_call(index.classify_grid, play)
+    grid_labels = [None if match < 0 else tile_templates[match][1] for match in grid.ravel()]
+
+    utils.log("BENCH", F"{len(tile_templates)} templates, 441 tiles")
+    utils.log("BENCH", F"linear scan: {linear_ms:8.2f} ms")
+    utils.log("BENCH", F"index, cold: {cold_ms:8.2f} ms")
+    utils.log("BENCH", F"index, warm: {warm_ms:8.2f} ms ({linear_ms / warm_ms:.1f}x)")
+    utils.log("BENCH", F"batch grid:  {grid_ms:8.2f} ms ({linear_ms / grid_ms:.1f}x)")
+    utils.log("BENCH", F"labels agree: {labels == expected and grid_labels == expected}")
+
+
+def legacy_get_path(game_map, start, goal):
+    """
+        The original dict-based A* search, kept as the baseline
+        """
+    closed_set = set()
+    came_from = dict()
+    g_score = {start: 0}
+    f_score = {start: (goal[0] - start[0]) ** 2 + (goal[1] - start[1]) ** 2}
+    open_heap = [(f_score[start], start)]
+
+    while open_heap:
+        current = heappop(open_heap)[1]
+        if current == goal:
+            path = [current]
+            while current in came_from:
+                current = came_from[current]
+                path.insert(0, current)
+            return path[1::]
+
+        closed_set.add(current)
+        neighbours = [(current[0], current[1]+1), (current[0], current[1]-1),
+                      (current[0] + 1, current[1]), (current[0]-1, current[1])]
+        for neighbour in neighbours:
+            if neighbour in closed_set:
+                continue
+            dimensions = game_map.shape
+            if not 0 <= neighbour[0] < dimensions[0] or not 0 <= neighbour[1] < dimensions[1]:
+                continue
+            if game_map[neighbour] >= GameMap.TILES.INACCESSIBLE.value:
+                continue
+            tentative_g_score = g_score[current] + 1
+            if neighbour in g_score and tentative_g_score >= g_score[neighbour]:
+                continue
+            g_score[neighbour] = tentative_g_score
+            f_score[neighbour] = tentative_g_score + \
+                (goal[0] - neighbour[0]) ** 2 + (goal[1] - neighbour[1]) ** 2
+            if neighbour not in open_heap:
+                heappush(open_heap, (f_score[neighbour], neighbour))
+            came_from[neighbour] = current
+    return None
+
+
+def benchmark_map(map_path=None):
+    """
+        Returns a saved map, or a seeded random map with the same borders
+        as a new GameMap when no path is given
+        """
+    if map_path is not None:
+        return np.load(map_path)
+
+    game_map = np.full((82, 240), GameMap.TILES.ACCESSIBLE.value, dtype=np.uint8)
+    obstacles = np.random.RandomState(3156).rand(82, 240) < 0.2
+    game_map[obstacles] = GameMap.TILES.INACCESSIBLE.value
+    game_map[:, 0:166] = GameMap.TILES.INACCESSIBLE.value
+    game_map[:, -10:-1] = GameMap.TILES.INACCESSIBLE.value
+    game_map[0, :] = GameMap.TILES.INACCESSIBLE.value
+    game_map[-10:-1, :] = GameMap.TILES.INACCESSIBLE.value
+
+    # Keep the fixed destinations walkable
+    for destination in ROUTE_POINTS.values():
+        game_map[destination] = GameMap.TILES.ACCESSIBLE.value
+    return game_map
+
+
+ROUTE_POINTS = {
+    'MOUNTAIN_RANGE': Move.MOUNTAIN_RANGE,
+    'WEAPON_SHOPKEEPER': Move.WEAPON_SHOPKEEPER,
+    'BANKER': Move.BANKER,
+    'ANVIL': Move.ANVIL,
+    'ITEM_SHOPKEEPER': Move.ITEM_SHOPKEEPER,
+}
+
+ROUTES = (
+    ('MOUNTAIN_RANGE', 'WEAPON_SHOPKEEPER'),
+    ('MOUNTAIN_RANGE', 'BANKER'),
+    ('ANVIL', 'MOUNTAIN_RANGE'),
+    ('ITEM_SHOPKEEPER', 'MOUNTAIN_RANGE'),
+)
+
+
+def benchmark_paths(map_path=None):
+    """
+        Compares the flat-buffer A* engine with the original search on long
+        routes between the fixed destinations
+        """
+    game_map = benchmark_map(map_path)
+
+    for source, destination in ROUTES:
+        start = ROUTE_POINTS[source]
+        goal = ROUTE_POINTS[destination]
+        legacy_ms, legacy_path = time_call(legacy_get_path, game_map, start, goal, repeat=3)
+        engine_ms, path = time_call(astar.get_path, game_map, start, goal)
+
+        legacy_length = len(legacy_path) if legacy_path is not None else None
+        length = len(path) if path is not None else None
+        utils.log("BENCH", F"{source} -> {destination}: legacy {legacy_ms:8.2f} ms "
+                           F"({legacy_length} steps), engine {engine_ms:8.2f} ms ({length} steps)")
+
+    # Failed searches exhaust the reachable map, as when an NPC blocks the goal
+    blocked = game_map.copy()
+    x, y = Move.MOUNTAIN_RANGE
+    blocked[(x - 1):(x + 2), (y - 1):(y + 2)] = GameMap.TILES.INACCESSIBLE.value
+    blocked[x, y] = GameMap.TILES.ACCESSIBLE.value
+    legacy_ms, _ = time_call(legacy_get_path, blocked, Move.WEAPON_SHOPKEEPER, (x, y), repeat=3)
+    engine_ms, _ = time_call(astar.get_path, blocked, Move.WEAPON_SHOPKEEPER, (x, y))
+    utils.log("BENCH", F"unreachable goal: legacy {legacy_ms:8.2f} ms, engine {engine_ms:8.2f} ms")
+
+
+def walk(game_map, start, goal, replan):
+    """
+        Walks a route one step at a time while an NPC paces back and forth
+        beside it, calling replan(map, position, changed_cells) for the
+        path after each step
+        """
+    game_map = game_map.copy()
+    for cell in NPC_CELLS:
+        game_map[cell] = GameMap.TILES.ACCESSIBLE.value
+
+    position = start
+    path = replan(game_map, position, [])
+    steps = 0
+    while path and steps < 500:
+        # The NPC steps to its other cell
+        game_map[NPC_CELLS[steps % 2]] = GameMap.TILES.ACCESSIBLE.value
+        game_map[NPC_CELLS[(steps + 1) % 2]] = GameMap.TILES.WEAPON_SHOPKEEPER.value
+
+        position = path[0]
+        path = replan(game_map, position, list(NPC_CELLS))
+        steps += 1
+    return steps
+
+
+# Cells the NPC paces between, beside the ITEM_SHOPKEEPER to MOUNTAIN_RANGE route
+NPC_CELLS = ((40, 215), (41, 215))
+
+
+def benchmark_replanning(map_path=None):
+    """
+        Compares searching from scratch after every step with repairing the
+        incremental planner's path
+        """
+    game_map = benchmark_map(map_path)
+    start = Move.ITEM_SHOPKEEPER
+    goal = Move.MOUNTAIN_RANGE
+
+    def from_scratch(current_map, position, _):
+        return astar.get_path(current_map, position, goal)
+
+    def incremental(current_map, position, changed):
+        if changed:
+            planners[-1].update_cells(changed)
+        else:
+            planners.append(Planner(current_map, goal))
+        return planners[-1].get_path(position)
+
+    planners = []
+    scratch_ms, steps = time_call(walk, game_map, start, goal, from_scratch, repeat=3)
+    incremental_ms, _ = time_call(walk, game_map, start, goal, incremental, repeat=3)
+    utils.log("BENCH", F"{steps} steps, from scratch {scratch_ms / steps:6.3f} ms/step, "
+                       F"incremental {incremental_ms / steps:6.3f} ms/step")
+
+
+# Tesseract preprocessing and configuration for each kind of crop, picked
+# by the prefix of the crop's file name
+OCR_CROPS = {
+    'weight': (UserInterface.prepare_readout, utils.TESSERACT_CONF),
+    'health': (UserInterface.prepare_readout, utils.TESSERACT_CONF),
+    'sextant': (GameMap.prepare_sextant, '--psm 8'),
+    'question': (utils.prepare_question, utils.TESSERACT_CONF),
+}
+
+
+def benchmark_ocr(crops_directory):
+    """
+        Compares the glyph recognizer, Tesseract started per read and the
+        persistent Tesseract engine on saved crops. Each crop, e.g.
+        weight_1.png, has its expected text in weight_1.txt
+        """
+    crops = sorted(f for f in os.listdir(crops_directory) if f.endswith('.png'))
+    if not crops:
+        utils.log("BENCH", F"No crops in {crops_directory}")
+        return
+
+    totals = {'glyphs': [0, 0.0], 'subprocess': [0, 0.0], 'engine': [0, 0.0], 'combined': [0, 0.0]}
+    unread = 0
+    for file_name in crops:
+        path = os.path.join(crops_directory, file_name)
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        with open(path[:-len('.png')] + '.txt') as text_file:
+            expected = ''.join(text_file.read().split())
+        preprocess, config = OCR_CROPS[file_name.split('_')[0]]
+        prepared = preprocess(image)
+
+        # Warm the engine up so its one-time start is not counted
+        ocr.image_to_string(prepared, config)
+
+        results = {
+            'glyphs': time_call(glyphs.read, image),
+            'subprocess': time_call(
+                lambda: pytesseract.image_to_string(prepared, config=config), repeat=3),
+            'engine': time_call(ocr.image_to_string, prepared, config, repeat=3),
+            'combined': time_call(utils.read_text, image, preprocess, config, repeat=3),
+        }
+
+        if results['glyphs'][1] is None:
+            unread += 1
+        for name, (milliseconds, text) in results.items():
+            totals[name][0] += text is not None and ''.join(text.split()) == expected
+            totals[name][1] += milliseconds
+
+    utils.log("BENCH", F"{len(crops)} crops, {unread} left to Tesseract by the glyph recognizer")
+    utils.log("BENCH", F"engine: {type(ocr.OCR.get_engine(utils.TESSERACT_CONF)).__name__}")
+    for name, (correct, milliseconds) in totals.items():
+        utils.log("BENCH", F"{name:10}: {correct}/{len(crops)} correct, "
+                           F"{milliseconds / len(crops):8.2f} ms per read")
+
+
+def grab_and_convert(backend, region):
+    """
+        Captures the screen or a region and converts it to grayscale
+        """
+    frame = backend.grab(region)
+    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+
+def benchmark_capture():
+    """
+        Compares capturing and converting the whole screen with capturing
+        only each named region, using the configured capture backend
+        """
+    backend = capture.get_backend()
+    full_ms, frame = time_call(grab_and_convert, backend, None)
+    utils.log("BENCH", F"{type(backend).__name__}, full screen: {full_ms:8.2f} ms, {frame.nbytes} bytes")
+
+    for name in capture.REGIONS:
+        region_ms, frame = time_call(grab_and_convert, backend, capture.screen_region(name))
+        utils.log("BENCH", F"{name:12}: {region_ms:8.2f} ms ({full_ms / region_ms:.1f}x), {frame.nbytes} bytes")
+
+
+def move_in_place(backend, events):
+    """
+        Sends cursor moves to where the cursor already is
+        """
+    x, y = backend.position()
+    for _ in range(events):
+        backend.move_to(x, y)
+
+
+def benchmark_input(events=100):
+    """
+        Compares the per-event cost of the input backends. Only moves the
+        cursor onto itself, so nothing is sent to the game
+        """
+    events = int(events)
+    for name in ('xtest', 'pyautogui'):
+        try:
+            backend = input_backends.BACKENDS[name]()
+        except (ImportError, ConnectionError):
+            utils.log("BENCH", F"{name}: not available")
+            continue
+        milliseconds, _ = time_call(move_in_place, backend, events, repeat=3)
+        utils.log("BENCH", F"{name:10}: {milliseconds / events:8.3f} ms per event")
+
+
+# Where the drive replays are recorded, the spot move_to stops at to buy
+# from the blacksmith
+DRIVE_POSITION = Move.FURNACE
+
+
+def drive(replay_path, action):
+    """
+        Runs an action against replayed frames with a fresh recording input
+        backend, sending anything left queued at the end. Returns the backend
+        """
+    backend = input_backends.RecordingInput(actions.NEUTRAL)
+    input_backends.set_backend(backend)
+    capture.set_backend(capture.ReplayCapture(replay_path))
+    FRAMES.invalidate()
+    action()
+    actions.INPUT.flush()
+    return backend
+
+
+def check_recording(name, backend, expected):
+    """
+        Asserts a recording sent the expected events, cursor moves aside, in
+        order and took a pause per event plus a tween per move that isn't a
+        jump to the neutral position. Returns the events with their moves
+        """
+    events = [event[1:] for event in backend.events]
+    sent = [event for event in events if event[0] != 'move']
+    assert sent == expected, F"{name} sent {sent}, expected {expected}"
+
+    profile = actions.INPUT.profile
+    tweens = sum(1 for event in events if event[0] == 'move' and event[1:] != actions.NEUTRAL)
+    seconds = len(events) * profile['pause'] + tweens * profile['tween']
+    assert abs(backend.elapsed - seconds) < 1e-6, \
+        F"{name} took {backend.elapsed:.3f}s of input, expected {seconds:.3f}s"
+
+    utils.log("BENCH", F"{name:10}: {len(events)} events, {backend.elapsed:.3f}s of input")
+    return events
+
+
+def clicked_at(events, click):
+    """
+        Returns where the cursor was moved to before the given click
+        """
+    index = events.index(click)
+    return next(event[1:] for event in reversed(events[:index]) if event[0] == 'move')
+
+
+def benchmark_drive(replay_directory):
+    """
+        Drives a step, an item use and a purchase without a display. Input
+        goes to a recording backend and frames are replayed from the step,
+        use_item and buy_item folders of the directory, each recorded in
+        order standing at DRIVE_POSITION, with the step going east. Checks
+        the events each one sends and the time they take
+        """
+    # The map is kept in a scratch directory, away from the saved map
+    with tempfile.TemporaryDirectory() as directory:
+        store = MapStore(os.path.join(directory, 'map.npy'), legacy_path=None)
+        game_map = GameMap(store)
+        try:
+            drive_actions(replay_directory, game_map)
+        finally:
+            store.stop()
+
+
+def drive_actions(replay_directory, game_map):
+    """
+        Drives and checks each action on a map, see benchmark_drive
+        """
+    move = Move(game_map)
+
+    # Step east, the replay shows the play region shifting a tile. The
+    # position is known, as if just read from the sextant
+    game_map.set_player_position(DRIVE_POSITION)
+    game_map.tracker.confirm()
+    step_to = (DRIVE_POSITION[0] + 1, DRIVE_POSITION[1])
+    backend = drive(os.path.join(replay_directory, 'step'), lambda: move.step(step_to))
+    check_recording('step', backend, [('press', 'd')])
+    assert game_map.player_position == step_to, F"step ended at {game_map.player_position}"
+
+    # Use ore on the smelter, as smelting does
+    game_map.set_player_position(DRIVE_POSITION)
+    backpack = Backpack()
+    backend = drive(os.path.join(replay_directory, 'use_item'),
+                    lambda: backpack.use_item('ore', (176, 161), (8, 6), True))
+    events = check_recording('use_item', backend, [('double_click',), ('click',)])
+    assert clicked_at(events, ('click',)) == (176, 161)
+    assert events[-1] == ('move',) + actions.NEUTRAL
+
+    # Buy a pickaxe from the blacksmith beside the player
+    merchant = Merchant(game_map, move)
+    backend = drive(os.path.join(replay_directory, 'buy_item'),
+                    lambda: merchant.buy_item('pickaxe', Merchant.MERCHANTS.BLACKSMITH))
+    events = check_recording('buy_item', backend, [('double_click',), ('click',), ('double_click',),
+                                                   ('click',), ('click',)])
+    x, y = clicked_at(events, ('double_click',))
+    assert abs(x - 176) <= 32 and abs(y - 176) <= 32, F"merchant double clicked at {(x, y)}"
+
+
+BENCHMARKS = {
+    'tiles': benchmark_tiles,
+    'paths': benchmark_paths,
+    'replan': benchmark_replanning,
+    'ocr': benchmark_ocr,
+    'capture': benchmark_capture,
+    'input': benchmark_input,
+    'drive': benchmark_drive,
+}
+
+if __name__ == '__main__':
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
@@ -0,0 +1,174 @@
+"""
+    This module provides the screen capture backends used to grab frames
+    of the game directly into memory
+    """
+import os
+import cv2
+import numpy as np
+
+# Backend used by utilities.take_screenshot: 'x11', 'pyautogui' or 'replay'
+CAPTURE_BACKEND = os.environ.get('GAME_AI_CAPTURE', 'x11')
+
+# Directory (or single image) frames are read from by the replay backend
+REPLAY_PATH = os.environ.get('GAME_AI_REPLAY', './replay')
+
+# Screen position of the game window's top left corner
+GAME_ORIGIN = (0, 0)
+
+# Named (x, y, width, height) regions of the game window
+REGIONS = {
+    'play': (8, 8, 336, 336),
+    'last_message': (0, 450, 170, 30),
+    'smelter': (168, 152, 16, 16),
+    'sextant': (120, 450, 60, 15),
+}
+
+
+def screen_region(region):
+    """
+        Returns the (x, y, width, height) on screen of a named region or an
+        explicit region, both relative to the game window
+        """
+    if isinstance(region, str):
+        region = REGIONS[region]
+    x, y, width, height = region
+    return (GAME_ORIGIN[0] + x, GAME_ORIGIN[1] + y, width, height)
+
+
+class X11Capture:
+    """
+        Grabs the screen from the X server straight into a numpy array
+        """
+
+    def __init__(self):
+        # mss is only needed when this backend is selected
+        import mss
+        from mss.exception import ScreenShotError
+
+        # No reachable X display can't be grabbed from
+        try:
+            self.grabber = mss.mss()
+        except ScreenShotError as screenshot_error:
+            raise ConnectionError(F"Can't grab the X display: {screenshot_error}")
+        self.monitor = self.grabber.monitors[0]
+
+    def grab(self, region=None):
+        """
+            Returns the current screen, or an (x, y, width, height) region
+            of it, as a BGR image
+            """
+        monitor = self.monitor
+        if region is not None:
+            x, y, width, height = region
+            monitor = {'left': self.monitor['left'] + x, 'top': self.monitor['top'] + y,
+                       'width': width, 'height': height}
+        shot = self.grabber.grab(monitor)
+        frame = np.frombuffer(shot.raw, dtype=np.uint8)
+        frame = frame.reshape(shot.height, shot.width, 4)
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+
+class PyAutoGuiCapture:
+    """
+        Grabs the screen with pyautogui without writing it to disk
+        """
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def grab(self, region=None):
+        """
+            Returns the current screen, or an (x, y, width, height) region
+            of it, as a BGR image
+            """
+        frame = np.asarray(self.pyautogui.screenshot(region=region))
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+
+class ReplayCapture:
+    """
+        Replays previously saved screenshots. Grabs of different regions
+        share a frame, the next frame is replayed once a region, or the
+        whole screen, is grabbed again. Once every frame has been returned
+        the last one is repeated
+        """
+
+    def __init__(self, path=REPLAY_PATH):
+        if os.path.isdir(path):
+            files = sorted(f for f in os.listdir(path) if f.endswith('.png'))
+            paths = [os.path.join(path, f) for f in files]
+        else:
+            paths = [path]
+
+        if not paths:
+            raise FileNotFoundError(F"No frames to replay in {path}")
+
+        # Decode every frame up front so grabbing stays cheap
+        self.frames = []
+        for frame_path in paths:
+            frame = cv2.imread(frame_path)
+            if frame is None:
+                raise ValueError(F"Unable to read replay frame {frame_path}")
+            self.frames.append(frame)
+        self.index = 0
+
+        # Regions already grabbed from the current frame
+        self.grabbed = set()
+
+    def grab(self, region=None):
+        """
+            Returns the current saved frame, or an (x, y, width, height)
+            region of it, moving on to the next frame when the region was
+            already grabbed from this one
+            """
+        region = None if region is None else tuple(region)
+        if region in self.grabbed and self.index < len(self.frames) - 1:
+            self.index += 1
+            self.grabbed.clear()
+        self.grabbed.add(region)
+
+        frame = self.frames[self.index]
+        if region is not None:
+            x, y, width, height = region
+            frame = frame[y:(y + height), x:(x + width)]
+        return frame.copy()
+
+
+BACKENDS = {
+    'x11': X11Capture,
+    'pyautogui': PyAutoGuiCapture,
+    'replay': ReplayCapture,
+}
+
+_backend = None
+
+
+def create_backend():
+    """
+        Returns a new instance of the configured capture backend. Falls
+        back to pyautogui when the X11 grabber is unavailable or can't
+        reach a display
+        """
+    try:
+        return BACKENDS[CAPTURE_BACKEND]()
+    except (ImportError, ConnectionError):
+        return PyAutoGuiCapture()
+
+
+def get_backend():
+    """
+        Returns the configured capture backend, creating it on first use
+        """
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """
+        Replaces the capture backend, e.g. with a ReplayCapture for tests
+        """
+    global _backend
+    _backend = backend
@@ -0,0 +1,194 @@
+"""
+    This module keeps a reverse breadth-first distance field for a fixed
+    destination so the next step towards it is a single lookup
+    """
+from collections import deque
+import heapq
+import numpy as np
+from game_map import GameMap
+
+# Tiles that move around, they do not affect the field and are only avoided
+# when choosing the next step
+MOVING_TILES = (GameMap.TILES.WEAPON_SHOPKEEPER, GameMap.TILES.ITEM_SHOPKEEPER,
+                GameMap.TILES.POTION_SHOPKEEPER, GameMap.TILES.BANKER,
+                GameMap.TILES.BLACKSMITH, GameMap.TILES.PLAYER)
+
+
+class DistanceField:
+    """
+        Number of steps from every cell to a destination over the walkable
+        tiles of the map. The field is built once and repaired in place when
+        the walkability of cells changes
+        """
+
+    def __init__(self, game_map, goal):
+        self.game_map = game_map
+        self.goal = goal
+        self.distances = None
+        self.walkable = None
+        self.compute()
+
+    @staticmethod
+    def walkable_cells(game_map):
+        """
+            Cells the field spreads over, walkable tiles and moving tiles
+            """
+        return (game_map < GameMap.TILES.INACCESSIBLE.value) | np.isin(game_map, MOVING_TILES)
+
+    def compute(self):
+        """
+            Breadth-first search outwards from the destination
+            """
+        height, width = self.game_map.shape
+        walkable = self.walkable_cells(self.game_map)
+        passable = walkable.tobytes()
+        distances = [-1] * (height * width)
+
+        goal_index = self.goal[0] * width + self.goal[1]
+        queue = deque()
+        if passable[goal_index]:
+            distances[goal_index] = 0
+            queue.append(goal_index)
+
+        while queue:
+            current = queue.popleft()
+            distance = distances[current] + 1
+            x, y = divmod(current, width)
+
+            neighbours = []
+            if y + 1 < width:
+                neighbours.append(current + 1)
+            if y > 0:
+                neighbours.append(current - 1)
+            if x + 1 < height:
+                neighbours.append(current + width)
+            if x > 0:
+                neighbours.append(current - width)
+
+            for neighbour in neighbours:
+                if passable[neighbour] and distances[neighbour] < 0:
+                    distances[neighbour] = distance
+                    queue.append(neighbour)
+
+        self.distances = np.array(distances, dtype=np.int32).reshape(height, width)
+        self.walkable = walkable
+
+    def neighbours(self, index):
+        """
+            Returns the flat indices of the cells beside a flat index
+            """
+        height, width = self.distances.shape
+        x, y = divmod(index, width)
+        neighbours = []
+        if y + 1 < width:
+            neighbours.append(index + 1)
+        if y > 0:
+            neighbours.append(index - 1)
+        if x + 1 < height:
+            neighbours.append(index + width)
+        if x > 0:
+            neighbours.append(index - width)
+        return neighbours
+
+    def update_cells(self, cells):
+        """
+            Repair the field after the walkability of (x, y) cells changed.
+            Only cells whose distance can change are recomputed: a blocked
+            cell resets the cells whose every shortest route went through
+            it, which are then filled in again from the intact cells around
+            them, and an opened cell spreads the shorter distances it
+            creates. The cost grows with the number of cells whose distance
+            changes, not with the size of the map
+            """
+        width = self.distances.shape[1]
+        distances = self.distances.reshape(-1)
+        walkable = self.walkable.reshape(-1)
+
+        blocked = []
+        opened = []
+        for x, y in cells:
+            now_walkable = bool(self.walkable_cells(self.game_map[x, y]))
+            if now_walkable == self.walkable[x, y]:
+                continue
+            walkable[x * width + y] = now_walkable
+            if now_walkable:
+                opened.append(x * width + y)
+            else:
+                blocked.append(x * width + y)
+
+        # Reset the cells downstream of the blocked cells that lost every
+        # neighbour one step closer to the destination, nearest first so a
+        # cell is only checked once all closer cells have been settled
+        reset = set(index for index in blocked if distances[index] >= 0)
+        queue = [(int(distances[index]), index) for index in reset]
+        heapq.heapify(queue)
+        while queue:
+            distance, current = heapq.heappop(queue)
+            for neighbour in self.neighbours(current):
+                if distances[neighbour] != distance + 1 or neighbour in reset:
+                    continue
+                supported = any(distances[other] == distance and other not in reset
+                                and walkable[other] for other in self.neighbours(neighbour))
+                if not supported:
+                    reset.add(neighbour)
+                    heapq.heappush(queue, (distance + 1, neighbour))
+        for index in reset:
+            distances[index] = -1
+
+        # Seed the reset cells from the intact cells bordering them, and the
+        # opened cells from their neighbours
+        seeds = []
+        goal_index = self.goal[0] * width + self.goal[1]
+        for index in reset.union(opened):
+            if not walkable[index]:
+                continue
+            if index == goal_index:
+                seeds.append((0, index))
+                continue
+            reached = [distances[neighbour] for neighbour in self.neighbours(index)
+                       if distances[neighbour] >= 0]
+            if reached:
+                seeds.append((int(min(reached)) + 1, index))
+
+        # Spread the seeded distances wherever they are shorter
+        heapq.heapify(seeds)
+        while seeds:
+            distance, current = heapq.heappop(seeds)
+            if 0 <= distances[current] <= distance:
+                continue
+            distances[current] = distance
+            for neighbour in self.neighbours(current):
+                if walkable[neighbour] and not 0 <= distances[neighbour] <= distance + 1:
+                    heapq.heappush(seeds, (distance + 1, neighbour))
+
+    def distance(self, position):
+        """
+            Returns the number of steps from a position to the destination,
+            or None when the destination can't be reached
+            """
+        distance = self.distances[position]
+        if distance < 0:
+            return None
+        return int(distance)
+
+    def next_step(self, position):
+        """
+            Returns the neighbouring cell one step closer to the destination
+            that is free right now, or None when there is none
+            """
+        distance = self.distance(position)
+        if not distance:
+            return None
+
+        height, width = self.game_map.shape
+        x, y = position
+        for neighbour in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if not (0 <= neighbour[0] < height and 0 <= neighbour[1] < width):
+                continue
+            if self.distances[neighbour] != distance - 1:
+                continue
+
+            # Moving tiles such as NPCs block the step for now
+            if self.game_map[neighbour] < GameMap.TILES.INACCESSIBLE.value:
+                return neighbour
+        return None
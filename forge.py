@@ -2,11 +2,13 @@
     This module performs forging related tasks
     """
 from time import sleep
-import pyautogui
 import utilities as utils
+import wait
+import templates
 from move import Move
 from user_interface import UserInterface
 from merchant import Merchant
+from actions import INPUT
 
 class Forge():
     """
@@ -31,7 +33,7 @@ class Forge():
         if not self.player.backpack.get_item('sextant'):
             # Not at the shopkeeper and no sextant, move left 4 times
             for _ in range(4):
-                pyautogui.press('a')
+                INPUT.press('a')
                 sleep(0.3)
             self.game_map.player_position = self.move.WEAPON_SHOPKEEPER
 
@@ -78,7 +80,8 @@ class Forge():
         self.player.backpack.use_item('hammer', (ingot[0] + 6, ingot[1] + 6), (7, 3))
 
         # Allow the blacksmith menu to fail a few times
-        if not self.user_interface.wait_for_ui_element('blacksmithMenu', False):
+        menu = self.user_interface.wait_for_ui_element('blacksmithMenu', False)
+        if not menu:
             self.errors += 1
 
             # Something must actually be wrong
@@ -92,10 +95,15 @@ class Forge():
         # Found the menu, reset error count
         self.errors = 0
 
-        # Forge a Battle Axe
+        # Forge a Battle Axe and wait for the blacksmith menu to close
         weapon = self.user_interface.wait_for_ui_element(self.ITEM)
-        pyautogui.moveTo(weapon[0] + 9, weapon[1] + 10, 0.15)
-        pyautogui.doubleClick()
+        INPUT.double_click(weapon[0] + 9, weapon[1] + 10)
+        INPUT.neutral()
+        height, width = templates.get('ui_elements/blacksmithMenu').shape[:2]
+        menu_region = (menu[0] - 4, menu[1] - 4, width + 8, height + 8)
+        closed = wait.template_vanished('ui_elements/blacksmithMenu', menu_region)
+        if not wait.wait_until(closed, 2.1):
+            utils.log("WARN", "Blacksmith menu still open 2.1 seconds after forging")
 
         # Continue forging
         return self.player.TASKS.FORGE
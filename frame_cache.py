@@ -0,0 +1,113 @@
+"""
+    This module shares the most recent frame between every consumer in a
+    tick. A frame is reused until an input event is sent to the game or it
+    is older than FRAME_TTL, and template matches against it are memoized
+    """
+from time import monotonic
+import cv2
+import capture
+import templates
+
+# Seconds a frame stays valid when no input has been sent to the game
+FRAME_TTL = 0.25
+
+
+class FrameCache:
+    """
+        Holds the most recent frame along with its grayscale variant and
+        the template matches already computed against it
+        """
+
+    def __init__(self, ttl=FRAME_TTL):
+        self.ttl = ttl
+        self.frame_id = 0
+        self.frame = None
+        self.grayscale = None
+        self.captured_at = 0
+        self.matches = dict()
+
+        # Regions captured on their own, keyed by their screen region
+        self.regions = dict()
+
+    def invalidate(self):
+        """
+            Forget the current frame so the next request captures a new one
+            """
+        self.frame = None
+        self.grayscale = None
+        self.matches.clear()
+        self.regions.clear()
+
+    def get_frame(self, grayscale=True):
+        """
+            Returns the current frame, capturing a new one if it is stale.
+            Frames are shared so they are handed out read-only
+            """
+        if self.frame is None or monotonic() - self.captured_at > self.ttl:
+            self.invalidate()
+            self.frame = capture.get_backend().grab()
+            self.frame.setflags(write=False)
+            self.frame_id += 1
+            self.captured_at = monotonic()
+
+        if not grayscale:
+            return self.frame
+
+        # Only convert to grayscale once per frame
+        if self.grayscale is None:
+            self.grayscale = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+            self.grayscale.setflags(write=False)
+        return self.grayscale
+
+    def get_region(self, region, grayscale=True):
+        """
+            Returns a named or (x, y, width, height) region of the current
+            frame. A valid full frame is sliced, otherwise only the region
+            is captured and converted
+            """
+        x, y, width, height = screen_region = capture.screen_region(region)
+        if self.frame is not None and monotonic() - self.captured_at <= self.ttl:
+            return self.get_frame(grayscale)[y:(y + height), x:(x + width)]
+
+        entry = self.regions.get(screen_region)
+        if entry is None or monotonic() - entry['captured_at'] > self.ttl:
+            frame = capture.get_backend().grab(screen_region)
+            frame.setflags(write=False)
+            entry = {'captured_at': monotonic(), 'frame': frame, 'grayscale': None}
+            self.regions[screen_region] = entry
+
+        if not grayscale:
+            return entry['frame']
+
+        if entry['grayscale'] is None:
+            entry['grayscale'] = cv2.cvtColor(entry['frame'], cv2.COLOR_BGR2GRAY)
+            entry['grayscale'].setflags(write=False)
+        return entry['grayscale']
+
+    def match_template(self, image, template_name, region=None):
+        """
+            Runs cv2.matchTemplate on an image, optionally restricted to an
+            (x, y, width, height) region of it. The template is looked up by
+            name in the variant matching the image. When the image is the
+            cached frame, the result is memoized by (frame id, template, region)
+            """
+        key = None
+        if image is self.frame or image is self.grayscale:
+            key = (self.frame_id, image.ndim, template_name, region)
+            if key in self.matches:
+                return self.matches[key]
+
+        if region is not None:
+            x, y, width, height = region
+            image = image[y:(y + height), x:(x + width)]
+
+        template = templates.get(template_name, image.ndim == 2)
+        result = cv2.matchTemplate(image, template, cv2.TM_CCORR_NORMED)
+
+        if key is not None:
+            self.matches[key] = result
+        return result
+
+
+FRAMES = FrameCache()
+
@@ -2,15 +2,18 @@
     This module is used to detect inaccessible tiles in the gameplay
     region and perform actions with them.
     """
-import os
-from enum import Enum
+from enum import IntEnum
 import re
 import numpy as np
 import cv2
-import pyautogui
-import pytesseract
 import utilities as utils
+import wait
+import tile_index
+from map_store import MapStore
+from position_tracker import PositionTracker
 from backpack import Backpack
+from actions import INPUT
+from logger import LOGGER
 
 class GameMap:
     """
@@ -18,49 +21,88 @@ class GameMap:
         region and perform actions with them.
         """
     TILE_DIM = 16
-    TILES = Enum(
+    TILES = IntEnum(
         'Tile', 'UNKNOWN, ACCESSIBLE, DOOR, GRAVEL, INACCESSIBLE, MOUNTAIN, WEAPON_SHOPKEEPER, ITEM_SHOPKEEPER, POTION_SHOPKEEPER, BANKER, BLACKSMITH, PLAYER')
 
-    def __init__(self):
+    # Template name patterns checked in order, the first match gives the tile label
+    TEMPLATE_PATTERNS = (
+        (r'rock', TILES.MOUNTAIN),
+        (r'door', TILES.DOOR),
+        (r'gravel', TILES.GRAVEL),
+        (r'shopkeeper', TILES.WEAPON_SHOPKEEPER),
+        (r'blacksmith', TILES.BLACKSMITH),
+        (r'guard', TILES.INACCESSIBLE),
+        (r'inaccessible', TILES.INACCESSIBLE),
+        (r'accessible', TILES.ACCESSIBLE),
+    )
+
+    # Cells of the nearby revealed by a step in each direction, indexed [x, y]
+    REVEALED_STRIPS = {'a': np.s_[0, :], 'd': np.s_[-1, :], 'w': np.s_[:, 0], 's': np.s_[:, -1]}
+
+    def __init__(self, store=None):
         """
             Create a tuple for each tile containing the following properties:
             0: tile data, 1: name
+
+            The map is saved by the given MapStore, or in the working
+            directory when none is given
             """
         self.backpack = Backpack()
 
-        try:
-            # Load the saved map from disk
-            self.game_map = np.loadtxt('map.txt', dtype=int)
-        except OSError:
+        # Load the saved map from disk
+        self.store = store if store is not None else MapStore()
+        self.game_map = self.store.load()
+
+        if self.game_map is None:
             # Map does not exist, create a new one
-            self.game_map = np.ones(shape=(82, 240), dtype="int")
+            self.game_map = np.ones(shape=(82, 240), dtype=np.uint8)
             self.game_map[:, 0:166] = self.TILES.INACCESSIBLE.value
             self.game_map[:, -10:-1] = self.TILES.INACCESSIBLE.value
             self.game_map[0, :] = self.TILES.INACCESSIBLE.value
             self.game_map[-10:-1, :] = self.TILES.INACCESSIBLE.value
-        
+            self.store.create(self.game_map)
+
+        # Write changes to disk in the background
+        self.store.start(self.game_map)
+
         # Initialize the player position
         self.player_position = (0, 0)
 
-        self.templates = []
-        # Load all accessible tile templates
-        for tile in [f for f in os.listdir('./accessible_tiles') if f.endswith('.png')]:
-            tile_template = cv2.imread('./accessible_tiles/' + tile)
-            tile_template = cv2.cvtColor(tile_template, cv2.COLOR_BGR2GRAY)
-            self.templates.append([tile_template, 'accessible/' + tile.split('.')[0]])
+        # Follows the player between sextant readings
+        self.tracker = PositionTracker()
+
+        # Callables told which (x, y) cells each map update changed
+        self.change_listeners = []
 
-        # Load all inaccessible tile templates
-        for tile in [f for f in os.listdir('./inaccessible_tiles') if f.endswith('.png')]:
-            tile_template = cv2.imread('./inaccessible_tiles/' + tile)
-            tile_template = cv2.cvtColor(tile_template, cv2.COLOR_BGR2GRAY)
-            self.templates.append([tile_template, 'inaccessible/' + tile.split('.')[0]])
+        # Distance fields towards fixed destinations, keyed by destination
+        self.distance_fields = dict()
 
-         # Load all NPC tile templates
-        for tile in [f for f in os.listdir('./npcs') if f.endswith('.png')]:
-            tile_template = cv2.imread('./npcs/' + tile)
-            tile_template = cv2.cvtColor(tile_template, cv2.COLOR_BGR2GRAY)
-            self.templates.append([tile_template, 'npcs/' + tile.split('.')[0]])
+        # Load all accessible, inaccessible and NPC tile templates and index them
+        self.templates = tile_index.load_templates()
+        self.tile_index = tile_index.TileIndex(self.templates)
+
+        # Resolve each template's tile label once, the extra last entry is
+        # the label for tiles that match no template
+        self.template_labels = np.array(
+            [self.template_label(name) for _, name in self.templates] +
+            [self.TILES.INACCESSIBLE.value], dtype=np.uint8)
+
+
+    def add_change_listener(self, listener):
+        """
+            Register a callable that receives the list of (x, y) cells
+            changed by each map update
+            """
+        self.change_listeners.append(listener)
 
+    @staticmethod
+    def prepare_sextant(position):
+        """
+            Resize and invert the sextant coordinates for Tesseract
+            """
+        position = cv2.resize(position, (0, 0), fx=5, fy=5)
+        position = cv2.bitwise_not(position)
+        return cv2.blur(position, (8, 8))
 
     def update_player_position(self, screenshot):
         """To update the player position the following steps are taken.
@@ -80,28 +122,24 @@ class GameMap:
 
         while sextant_x is None:
             # Move mouse to a neutral position that won't obstruct template matching
-            pyautogui.moveTo(400, 400)
+            INPUT.neutral()
 
-            # Find and use the sextant
+            # Find and use the sextant, then wait for the readout to show
+            # the location, at most as long as the old fixed delay
+            shown = wait.region_changed('sextant')
             self.backpack.use_item('sextant', None, (5, 2), True)
+            wait.wait_until(shown, 0.3)
 
-            # Take a new screenshot that includes the location
-            screenshot = utils.take_screenshot()
-
-            # Find the current position
-            position = screenshot[450: 465, 120: 180]
-
-            # Resize and parse the image to a string
-            position = cv2.resize(position, (0, 0), fx=5, fy=5)
-            position = cv2.bitwise_not(position)
-            position = cv2.blur(position, (8, 8))
+            # Capture the location
+            position = utils.take_screenshot(region='sextant')
 
+            # Parse the image to a string
             text = ''
 
             try:
-                text = pytesseract.image_to_string(position, config='--psm 8')
+                text = utils.read_text(position, self.prepare_sextant, '--psm 8')
                 # Split the text into coordinates
-                sextant_x, sextant_y = text.split(", ")[0::1]
+                sextant_x, sextant_y = text.split(",")[0::1]
             except UnicodeDecodeError:
                 utils.log(
                     "SEVERE", F"Unable to parse sextant coordinates string")
@@ -109,7 +147,7 @@ class GameMap:
             except ValueError as value_error:
                 utils.log("WARN", F"{value_error}")
                 # Move mouse to a neutral position that won't obstruct template matching
-                pyautogui.moveTo(400, 400)
+                INPUT.neutral()
                 errors += 1
 
             if errors == 10:
@@ -121,10 +159,48 @@ class GameMap:
         normalized_x = int(sextant_x) - utils.NORMALIZATION_CONSTANT
         normalized_y = int(sextant_y) - utils.NORMALIZATION_CONSTANT
 
+        self.set_player_position((normalized_x, normalized_y))
+        self.tracker.confirm()
+
+    def track_step(self, direction, before, after):
+        """
+            Update the player position after a step key press from how far
+            the play region shifted between captures taken before and after
+            it. The sextant is only used when the tracker is unsure
+            """
+        position = self.tracker.track(self.player_position, direction, before, after)
+        if position is None:
+            self.update_player_position(after)
+        else:
+            self.set_player_position(position)
+
+    def set_player_position(self, position):
+        """
+            Move the player tile on the map to a new position
+            """
         # Remove old player position from the map
         self.game_map[self.game_map == self.TILES.PLAYER.value] = self.TILES.ACCESSIBLE.value
-        self.player_position = (normalized_x, normalized_y)
+        self.store.mark_dirty(self.player_position[0], self.player_position[0] + 1,
+                              self.player_position[1], self.player_position[1] + 1)
+        self.player_position = position
         self.game_map[self.player_position] = self.TILES.PLAYER.value
+        LOGGER.context['position'] = position
+        self.store.mark_dirty(position[0], position[0] + 1, position[1], position[1] + 1)
+
+    def peek_tile(self, x_offset, y_offset, play=None):
+        """
+            Classify a single visible tile, given by its offset from the
+            player, straight from the play region without touching the map
+            """
+        if play is None:
+            play = utils.take_screenshot(region='play')
+
+        tile_x = (10 + x_offset) * self.TILE_DIM
+        tile_y = (10 + y_offset) * self.TILE_DIM
+        tile = play[tile_y:(tile_y + self.TILE_DIM), tile_x:(tile_x + self.TILE_DIM)]
+
+        # Unmatched tiles (index -1) are assumed inaccessible
+        return self.template_labels[self.tile_index.match(tile)]
 
     def match_template_type(self, tile, templates):
         """
@@ -151,94 +227,95 @@ class GameMap:
 
         return potential_tiles
 
-    def update_map(self, screenshot=None):
+    def template_label(self, name):
         """
-            Takes a screenshot of the game, this method will iterate
-            over the gameplay region in 16x16 chunks.  Each chunk is compared
-            with all potential inaccessible tiles until a match is found.
-
-            When a match is found, the frequency of that tile is incremented
-            so future chunks are compared with high frequency tiles first.
+            Returns the tile label for a template based on its name
             """
-        # Get the visible tiles
-        nearby = self.game_map[
-            (self.player_position[0] - 10): (self.player_position[0] + 11),
-            (self.player_position[1] - 10): (self.player_position[1] + 11)
-        ]
-
-        # Clear NPCs in the nearby as they may have moved
-        nearby[nearby == self.TILES.WEAPON_SHOPKEEPER.value] = self.TILES.UNKNOWN.value
-        nearby[nearby == self.TILES.BLACKSMITH.value] = self.TILES.UNKNOWN.value
-
-        # Take screenshot and isolate the gamplay region
-        if screenshot is None:
-            screenshot = utils.take_screenshot()
-        play = screenshot[8:344, 8:344]
-
-        # Loop through all unknown tiles in the nearby
-        for i, j in zip(*np.where(nearby == self.TILES.UNKNOWN.value)):
-            # Scale up the dimensions
-            tile_x = i * self.TILE_DIM
-            tile_y = j * self.TILE_DIM
-
-            # The center cell is always the player
-            if i == 10 and j == 10:
-                tile_x = self.player_position[0] + int(tile_x / 16) - 10
-                tile_y = self.player_position[1] + int(tile_y / 16) - 10
-                self.game_map[(tile_x, tile_y)] = self.TILES.PLAYER.value
-                continue
+        for pattern, tile in self.TEMPLATE_PATTERNS:
+            if re.search(pattern, name, re.M | re.I):
+                return tile.value
 
-            # Slice the tile from the play region
-            tile = play[tile_y:tile_y + self.TILE_DIM,
-                        tile_x:tile_x + self.TILE_DIM]
+        # By default, mark tile as inaccessible
+        return self.TILES.INACCESSIBLE.value
 
-            tile_x = self.player_position[0] + int(tile_x / 16) - 10
-            tile_y = self.player_position[1] + int(tile_y / 16) - 10
+    def step_candidates(self, nearby, npcs, direction):
+        """
+            Returns the cells of the nearby to classify after a single step:
+            the unknown cells of the strip the step revealed, the NPCs and
+            the accessible cells they could have stepped onto
+            """
+        revealed = np.zeros(nearby.shape, dtype=bool)
+        revealed[self.REVEALED_STRIPS[direction]] = True
+        candidates = revealed & (nearby == self.TILES.UNKNOWN.value)
 
-            # Go through all tile types looking for a high confidence match
-            template = None
-            for potential_template in self.templates:
-                if np.allclose(potential_template[0], tile, 1, 1):
-                    template = potential_template
-                    break
+        # NPCs move at most one tile between steps
+        moved_to = npcs.copy()
+        moved_to[1:, :] |= npcs[:-1, :]
+        moved_to[:-1, :] |= npcs[1:, :]
+        moved_to[:, 1:] |= npcs[:, :-1]
+        moved_to[:, :-1] |= npcs[:, 1:]
+        moved_to &= npcs | (nearby == self.TILES.ACCESSIBLE.value)
 
-            # No match, assume it is inaccessible
-            if template is None:
-                self.game_map[(tile_x, tile_y)] = self.TILES.INACCESSIBLE.value
-                continue
+        return candidates | moved_to
 
-            # By default, mark tile as inaccessible
-            label = None
-
-            # Mark as mineable
-            if re.search(r'rock', template[1], re.M | re.I):
-                label = self.TILES.MOUNTAIN.value
-            elif re.search(r'door', template[1], re.M | re.I):
-                label = self.TILES.DOOR.value
-            elif re.search(r'gravel', template[1], re.M | re.I):
-                label = self.TILES.GRAVEL.value
-            elif re.search(r'shopkeeper', template[1], re.M | re.I):
-                label = self.TILES.WEAPON_SHOPKEEPER.value
-            elif re.search(r'blacksmith', template[1], re.M | re.I):
-                label = self.TILES.BLACKSMITH.value
-            elif re.search(r'guard', template[1], re.M | re.I):
-                label = self.TILES.INACCESSIBLE.value
-            elif re.search(r'inaccessible', template[1], re.M | re.I):
-                label = self.TILES.INACCESSIBLE.value
-            elif re.search(r'accessible', template[1], re.M | re.I):
-                label = self.TILES.ACCESSIBLE.value
-
-            # Calculate coordinates of tile in the map relative to the player
-            self.game_map[(tile_x, tile_y)] = label
-
-        # Go through all tiles in the gameplay region to find the mountains
-        for i, j in zip(*np.where(nearby == self.TILES.MOUNTAIN.value)):
-            # Get the tile to the left of the mountain
-            tile_left = nearby[(i-1, j)]
-
-            # Only allow mountains to be minable if they are beside gravel
-            if not tile_left == self.TILES.GRAVEL.value:
-                nearby[(i, j)] = self.TILES.INACCESSIBLE.value
-
-        # Save the game map to disk
-        np.savetxt('map.txt', self.game_map, fmt='%d')
+    def update_map(self, play=None, direction=None):
+        """
+            Captures the gameplay region of the game and splits it
+            into 16x16 chunks.  Every unknown chunk is classified in a single
+            batch against the tile index and its label written to the map.
+
+            When the direction of a single step is given ('w', 'a', 's' or 'd'),
+            only the newly revealed strip and the cells NPCs may have moved
+            between are classified, the rest of the map is kept as is.
+            """
+        # Get the visible tiles
+        x_start = self.player_position[0] - 10
+        y_start = self.player_position[1] - 10
+        nearby = self.game_map[x_start:(x_start + 21), y_start:(y_start + 21)]
+        previous = nearby.copy()
+
+        npcs = (nearby == self.TILES.WEAPON_SHOPKEEPER.value) | \
+            (nearby == self.TILES.BLACKSMITH.value)
+
+        if direction is None:
+            # Clear NPCs in the nearby as they may have moved
+            nearby[npcs] = self.TILES.UNKNOWN.value
+            candidates = nearby == self.TILES.UNKNOWN.value
+        else:
+            candidates = self.step_candidates(nearby, npcs, direction)
+
+        # Capture the gameplay region
+        if play is None:
+            play = utils.take_screenshot(region='play')
+
+        # The center cell is always the player
+        candidates[10, 10] = False
+        if nearby[10, 10] == self.TILES.UNKNOWN.value:
+            nearby[10, 10] = self.TILES.PLAYER.value
+
+        # Classify every candidate tile in the nearby in one batch
+        matches = self.tile_index.classify_grid(play, candidates)
+
+        # Label the tiles, unmatched tiles (index -1) are assumed inaccessible
+        nearby[candidates] = self.template_labels[matches[candidates]]
+
+        # Find the tiles with gravel to their left, the column left of the
+        # nearby comes from the rest of the map
+        beside_gravel = np.zeros(nearby.shape, dtype=bool)
+        beside_gravel[1:, :] = nearby[:-1, :] == self.TILES.GRAVEL.value
+        if x_start > 0:
+            beside_gravel[0, :] = self.game_map[
+                x_start - 1, y_start:(y_start + nearby.shape[1])] == self.TILES.GRAVEL.value
+
+        # Only allow mountains to be minable if they are beside gravel
+        nearby[(nearby == self.TILES.MOUNTAIN.value) & ~beside_gravel] = self.TILES.INACCESSIBLE.value
+
+        # Queue the visible region to be saved to disk
+        self.store.mark_dirty(max(x_start, 0), x_start + 21, max(y_start, 0), y_start + 21)
+
+        # Tell listeners which cells of the map changed
+        changed = np.argwhere(previous != nearby) + (x_start, y_start)
+        if len(changed) > 0:
+            cells = [tuple(cell) for cell in changed.tolist()]
+            for listener in self.change_listeners:
+                listener(cells)
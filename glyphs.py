@@ -0,0 +1,141 @@
+"""
+    This module reads numbers rendered in the game's fixed UI font by
+    segmenting the glyphs and matching them against an atlas of glyphs
+    cut from the UI. Build the atlas from a crop with known text with:
+        python glyphs.py <crop.png> <text>
+    """
+import os
+import sys
+import numpy as np
+import cv2
+
+GLYPH_DIRECTORY = 'glyphs'
+
+# Atlas file names of the characters that can't be used in a file name
+GLYPH_FILE_NAMES = {'/': 'slash', ',': 'comma', '+': 'plus', '=': 'equals', '-': 'minus'}
+
+# Fraction of pixels a glyph must share with its atlas entry to be trusted
+MIN_SCORE = 0.9
+
+
+def binarize(image):
+    """
+        Returns the crop as a 0/1 image with the text as foreground. The
+        text is assumed to cover fewer pixels than the background
+        """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(image, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if binary.mean() > 0.5:
+        binary = 1 - binary
+    return binary
+
+
+def segment(binary):
+    """
+        Split a binarized line of text into glyphs on the empty columns,
+        each cropped to its own rows
+        """
+    columns = np.concatenate(([False], binary.any(axis=0), [False]))
+    edges = np.flatnonzero(columns[1:] != columns[:-1])
+
+    glyphs = []
+    for start, end in zip(edges[0::2], edges[1::2]):
+        glyph = binary[:, start:end]
+        rows = np.flatnonzero(glyph.any(axis=1))
+        glyphs.append(glyph[rows[0]:(rows[-1] + 1)])
+    return glyphs
+
+
+class GlyphRecognizer:
+    """
+        Matches segmented glyphs against the atlas. Reads are all or
+        nothing, if any glyph is not recognized with confidence the whole
+        read is rejected so the caller can fall back to Tesseract
+        """
+
+    def __init__(self, directory=GLYPH_DIRECTORY):
+        self.directory = directory
+        self.atlas = None
+
+    def load(self):
+        """
+            Load the binarized atlas glyphs, an empty atlas when there is none
+            """
+        self.atlas = []
+        if not os.path.isdir(self.directory):
+            return
+
+        characters = {name: character for character, name in GLYPH_FILE_NAMES.items()}
+        for file_name in sorted(f for f in os.listdir(self.directory) if f.endswith('.png')):
+            name = file_name.split('.')[0]
+            glyph = cv2.imread(os.path.join(self.directory, file_name), cv2.IMREAD_GRAYSCALE)
+            self.atlas.append((characters.get(name, name), glyph > 0))
+
+    def match(self, glyph):
+        """
+            Returns the atlas character closest to a glyph and the fraction
+            of pixels they share. Only glyphs of the same size are compared
+            """
+        best_character = None
+        best_score = 0.0
+        for character, atlas_glyph in self.atlas:
+            if atlas_glyph.shape != glyph.shape:
+                continue
+            score = float(np.mean(atlas_glyph == glyph))
+            if score > best_score:
+                best_character = character
+                best_score = score
+        return best_character, best_score
+
+    def read(self, image):
+        """
+            Returns the text in an unscaled crop, or None when the atlas
+            can't read it with confidence
+            """
+        if self.atlas is None:
+            self.load()
+        if not self.atlas:
+            return None
+
+        glyphs = segment(binarize(image))
+        if not glyphs:
+            return None
+
+        text = ''
+        for glyph in glyphs:
+            character, score = self.match(glyph > 0)
+            if score < MIN_SCORE:
+                return None
+            text += character
+        return text
+
+
+GLYPHS = GlyphRecognizer()
+
+
+def read(image):
+    """
+        Reads a crop with the shared recognizer, None when it is not confident
+        """
+    return GLYPHS.read(image)
+
+
+def save_glyphs(image, text, directory=GLYPH_DIRECTORY):
+    """
+        Cut the glyphs out of a crop showing known text, spaces excluded,
+        and add them to the atlas
+        """
+    glyphs = segment(binarize(image))
+    characters = text.replace(' ', '')
+    if len(glyphs) != len(characters):
+        raise ValueError(F"Found {len(glyphs)} glyphs for {len(characters)} characters")
+
+    os.makedirs(directory, exist_ok=True)
+    for character, glyph in zip(characters, glyphs):
+        name = GLYPH_FILE_NAMES.get(character, character)
+        cv2.imwrite(os.path.join(directory, name + '.png'), glyph * 255)
+
+
+if __name__ == '__main__':
+    save_glyphs(cv2.imread(sys.argv[1]), sys.argv[2])
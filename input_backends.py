@@ -0,0 +1,300 @@
+"""
+    This module provides the backends that deliver mouse and keyboard
+    events to the game
+    """
+import os
+from time import sleep
+
+# Backend used by actions.INPUT: 'xtest', 'pyautogui' or 'recording'
+INPUT_BACKEND = os.environ.get('GAME_AI_INPUT', 'xtest')
+
+# Cursor updates per second while tweening a move or drag
+TWEEN_RATE = 120
+
+# X keysym names of the pyautogui key names used by the tasks
+KEYSYMS = {'alt': 'Alt_L', 'ctrl': 'Control_L', 'shift': 'Shift_L',
+           'enter': 'Return', 'esc': 'Escape', 'space': 'space'}
+
+
+def ease_out_quad(n):
+    """
+        Tween progress easing out, as pyautogui.easeOutQuad
+        """
+    return -n * (n - 2)
+
+
+class XTestInput:
+    """
+        Sends events straight to the X server through the XTest extension,
+        without pyautogui's per-event checks and pauses
+        """
+
+    def __init__(self):
+        # python-xlib is only needed when this backend is selected
+        from Xlib import X, XK, display, error
+        from Xlib.ext import xtest
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+
+        # No reachable X server, or one without XTest, can't take the input
+        try:
+            self.display = display.Display()
+        except (error.DisplayError, error.XauthError, error.XNoAuthError) as display_error:
+            raise ConnectionError(F"Can't connect to the X display: {display_error}")
+        if not self.display.has_extension('XTEST'):
+            raise ConnectionError("The X display has no XTest extension")
+
+    def position(self):
+        """
+            Returns the cursor position
+            """
+        pointer = self.display.screen().root.query_pointer()
+        return (pointer.root_x, pointer.root_y)
+
+    def motion(self, x, y):
+        """
+            Warp the cursor to a position
+            """
+        self.xtest.fake_input(self.display, self.X.MotionNotify, x=int(x), y=int(y))
+        self.display.sync()
+
+    def move_to(self, x, y, duration=0):
+        """
+            Move the cursor, tweened over duration seconds
+            """
+        steps = int(duration * TWEEN_RATE)
+        if steps > 1:
+            start_x, start_y = self.position()
+            for step in range(1, steps):
+                progress = ease_out_quad(step / steps)
+                self.motion(start_x + (x - start_x) * progress, start_y + (y - start_y) * progress)
+                sleep(duration / steps)
+        self.motion(x, y)
+
+    def button(self, pressed):
+        """
+            Press or release the left mouse button
+            """
+        event = self.X.ButtonPress if pressed else self.X.ButtonRelease
+        self.xtest.fake_input(self.display, event, 1)
+        self.display.sync()
+
+    def click(self):
+        """
+            Click the left mouse button
+            """
+        self.button(True)
+        self.button(False)
+
+    def double_click(self):
+        """
+            Double click the left mouse button
+            """
+        self.click()
+        self.click()
+
+    def drag_to(self, x, y, duration):
+        """
+            Drag with the left mouse button held, tweened over duration seconds
+            """
+        self.button(True)
+        self.move_to(x, y, duration)
+        self.button(False)
+
+    def key(self, key, pressed):
+        """
+            Press or release a key given by its pyautogui name
+            """
+        keysym = self.XK.string_to_keysym(KEYSYMS.get(key, key))
+        keycode = self.display.keysym_to_keycode(keysym)
+        event = self.X.KeyPress if pressed else self.X.KeyRelease
+        self.xtest.fake_input(self.display, event, keycode)
+        self.display.sync()
+
+    def press(self, key):
+        """
+            Press and release a key
+            """
+        self.key(key, True)
+        self.key(key, False)
+
+    def hotkey(self, *keys):
+        """
+            Hold keys down in order and release them in reverse
+            """
+        for key in keys:
+            self.key(key, True)
+        for key in reversed(keys):
+            self.key(key, False)
+
+    def pause(self, seconds):
+        """
+            Wait between events
+            """
+        sleep(seconds)
+
+
+class PyAutoGuiInput:
+    """
+        Sends events through pyautogui
+        """
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+        # Pauses come from the speed profile instead
+        pyautogui.PAUSE = 0
+
+    def position(self):
+        """
+            Returns the cursor position
+            """
+        return tuple(self.pyautogui.position())
+
+    def move_to(self, x, y, duration=0):
+        """
+            Move the cursor, tweened over duration seconds
+            """
+        self.pyautogui.moveTo(x, y, duration)
+
+    def click(self):
+        """
+            Click the left mouse button
+            """
+        self.pyautogui.click()
+
+    def double_click(self):
+        """
+            Double click the left mouse button
+            """
+        self.pyautogui.doubleClick()
+
+    def drag_to(self, x, y, duration):
+        """
+            Drag with the left mouse button held, tweened over duration seconds
+            """
+        self.pyautogui.dragTo(x, y, duration, self.pyautogui.easeOutQuad, button='left')
+
+    def press(self, key):
+        """
+            Press and release a key
+            """
+        self.pyautogui.press(key)
+
+    def hotkey(self, *keys):
+        """
+            Hold keys down in order and release them in reverse
+            """
+        self.pyautogui.hotkey(*keys)
+
+    def pause(self, seconds):
+        """
+            Wait between events
+            """
+        sleep(seconds)
+
+
+class RecordingInput:
+    """
+        Records events in memory instead of sending them, so task code can
+        be driven and timed without a display. Tweens and pauses are added
+        to the simulated time instead of being waited out
+        """
+
+    def __init__(self, position=(0, 0)):
+        self.cursor = position
+        self.events = []
+        self.elapsed = 0.0
+
+    def record(self, *event):
+        """
+            Store an event with the simulated time it was sent at
+            """
+        self.events.append((self.elapsed,) + event)
+
+    def position(self):
+        """
+            Returns the cursor position
+            """
+        return self.cursor
+
+    def move_to(self, x, y, duration=0):
+        """
+            Move the cursor, taking duration seconds of simulated time
+            """
+        self.elapsed += duration
+        self.cursor = (x, y)
+        self.record('move', x, y)
+
+    def click(self):
+        """
+            Click the left mouse button
+            """
+        self.record('click')
+
+    def double_click(self):
+        """
+            Double click the left mouse button
+            """
+        self.record('double_click')
+
+    def drag_to(self, x, y, duration):
+        """
+            Drag with the left mouse button held
+            """
+        start = self.cursor
+        self.elapsed += duration
+        self.cursor = (x, y)
+        self.record('drag', start, (x, y))
+
+    def press(self, key):
+        """
+            Press and release a key
+            """
+        self.record('press', key)
+
+    def hotkey(self, *keys):
+        """
+            Press a key combination
+            """
+        self.record('hotkey', keys)
+
+    def pause(self, seconds):
+        """
+            Add a pause to the simulated time
+            """
+        self.elapsed += seconds
+
+
+BACKENDS = {
+    'xtest': XTestInput,
+    'pyautogui': PyAutoGuiInput,
+    'recording': RecordingInput,
+}
+
+_backend = None
+
+
+def get_backend():
+    """
+        Returns the configured input backend, creating it on first use.
+        Falls back to pyautogui when python-xlib is unavailable or can't
+        reach an X display with XTest
+        """
+    global _backend
+    if _backend is None:
+        try:
+            _backend = BACKENDS[INPUT_BACKEND]()
+        except (ImportError, ConnectionError):
+            _backend = PyAutoGuiInput()
+    return _backend
+
+
+def set_backend(backend):
+    """
+        Replaces the input backend, e.g. with a RecordingInput for tests
+        """
+    global _backend
+    _backend = backend
@@ -0,0 +1,130 @@
+"""
+    This module writes log records from a background thread. Logging only
+    queues a record, records are printed and appended to the log file in
+    batches, as text or JSON lines
+    """
+import atexit
+import datetime
+import json
+import os
+import queue
+import threading
+
+LOG_PATH = os.environ.get('GAME_AI_LOG', 'log.txt')
+
+# 'text' for the classic one line per record, 'json' for JSON lines
+LOG_FORMAT = os.environ.get('GAME_AI_LOG_FORMAT', 'text')
+
+# Seconds between background writes
+FLUSH_INTERVAL = 0.5
+
+# The log file is rotated once it would grow past MAX_BYTES, keeping
+# BACKUP_COUNT old files as log.txt.1, log.txt.2, ...
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+
+class Logger:
+    """
+        Queues log records and writes them from a daemon thread, started on
+        the first record. The current task and player position are kept in
+        context and attached to every record
+        """
+
+    def __init__(self, path=LOG_PATH, log_format=LOG_FORMAT, interval=FLUSH_INTERVAL,
+                 max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.log_format = log_format
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.context = {'task': None, 'position': None}
+        self.records = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def log(self, severity, message, **fields):
+        """
+            Queue a record, with any extra fields such as timings
+            """
+        self.records.put((datetime.datetime.now(), severity, message,
+                          dict(self.context), fields))
+        if self.thread is None:
+            self.start()
+
+    def start(self):
+        """
+            Start writing records in the background
+            """
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+            Stop the background thread and write any remaining records
+            """
+        self.stopped.set()
+        self.flush()
+
+    def format(self, record):
+        """
+            Returns a record as a line of text or JSON
+            """
+        time, severity, message, context, fields = record
+        if self.log_format == 'json':
+            entry = {'time': time.isoformat(), 'event': severity, 'message': str(message)}
+            entry.update(context)
+            entry.update(fields)
+            return json.dumps(entry, default=str)
+        return F"{time}: {severity}: {message}"
+
+    def rotate(self):
+        """
+            Shift the log file and its backups along, dropping the oldest
+            """
+        for index in range(self.backup_count - 1, 0, -1):
+            backup = F"{self.path}.{index}"
+            if os.path.exists(backup):
+                os.replace(backup, F"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, F"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def flush(self):
+        """
+            Print and write every queued record in one batch
+            """
+        with self.lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self.format(self.records.get_nowait()))
+                except queue.Empty:
+                    break
+            if not lines:
+                return
+
+            output = "\n".join(lines) + "\n"
+            print(output, end='')
+
+            if os.path.exists(self.path) and \
+                    os.path.getsize(self.path) + len(output) > self.max_bytes:
+                self.rotate()
+            with open(self.path, "a") as log_file:
+                log_file.write(output)
+
+    def run(self):
+        """
+            Periodically write the queued records until stopped
+            """
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+
+LOGGER = Logger()
@@ -5,11 +5,12 @@ import sys
 from time import sleep
 import traceback
 import cv2
-import pyautogui
 from game_map import GameMap
 import utilities as utils
 from user_interface import UserInterface
 from player import Player
+from actions import INPUT, Preempted
+from watchdog import ForegroundWatchdog, MacroWatcher, FOREGROUND
 
 # Set defaults
 task = Player.TASKS.MINE
@@ -27,15 +28,14 @@ utils.log("INIT", F"Default task set to {task}")
 
 # Find blocking window in screenshot
 screenshot = utils.take_screenshot(False)
-result = cv2.matchTemplate(screenshot, user_interface.templates['sponsored'], cv2.TM_CCORR_NORMED)
+result = utils.match_template(screenshot, 'ui_elements/sponsored')
 _, max_val, _, max_loc = cv2.minMaxLoc(result)
 
 # Found the blocking window window with high confidence
 if max_val > 0.9:
     click_at = (max_loc[0] + 428, max_loc[1] + 144)
     utils.log("INIT", "Closed blocking window")
-    pyautogui.moveTo(click_at[0], click_at[1], 0.15)
-    pyautogui.click()
+    INPUT.click(click_at[0], click_at[1])
     sleep(5)
 
 # Bring game to foreground
@@ -49,9 +49,38 @@ game_map.update_map()
 utils.log("INIT", "Field of view mapped")
 utils.log("INIT", "Initialization complete")
 utils.log("INIT", "====================================================")
+
+# Watch the game's state in the background, reading it is free
+watchdog = ForegroundWatchdog()
+watchdog.start()
+
+# Watch for macro challenges, which interrupt whatever task is running
+macro_watcher = MacroWatcher()
+macro_watcher.start()
+INPUT.preemption = macro_watcher.challenge
 try:
-    while utils.bring_game_to_foreground():
-        player.perform_task()
+    while True:
+        try:
+            if watchdog.state_changed():
+                utils.log("INFO", F"Game state changed to {watchdog.state}")
+
+            # Keep relaunching until the watchdog sees the game again
+            if watchdog.state != FOREGROUND:
+                utils.bring_game_to_foreground()
+            player.perform_task()
+        except Preempted:
+            # Resolving the challenge has to send input itself. Once the
+            # window has been found only the region around it is watched
+            INPUT.preemption = None
+            window_loc = utils.resolve_macro_check()
+            if window_loc is not None:
+                macro_watcher.locate(window_loc)
+
+            # The task may have been interrupted after a step was sent but
+            # before it was tracked, so the position is read again
+            game_map.tracker.confidence = 0.0
+            game_map.update_player_position(utils.take_screenshot())
+            INPUT.preemption = macro_watcher.challenge
 except Exception as exception:
     utils.log("SEVERE", exception)
     utils.log("SEVERE", traceback.format_exc())
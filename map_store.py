@@ -0,0 +1,107 @@
+"""
+    This module persists the game map to a memory-mapped binary file.
+    Changed regions are tracked and flushed to disk in the background
+    """
+import atexit
+import os
+import threading
+import numpy as np
+
+MAP_PATH = 'map.npy'
+LEGACY_MAP_PATH = 'map.txt'
+
+# Seconds between background flushes of the changed regions
+FLUSH_INTERVAL = 5
+
+
+class MapStore:
+    """
+        Keeps a uint8 .npy copy of the game map on disk. The game map itself
+        stays in memory, regions marked dirty are copied to the memory-mapped
+        file by a background thread
+        """
+
+    def __init__(self, path=MAP_PATH, legacy_path=LEGACY_MAP_PATH, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.interval = interval
+        self.file = None
+        self.game_map = None
+        self.dirty = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def load(self):
+        """
+            Returns the saved map, migrating the old text map the first time.
+            Returns None when no map has been saved yet
+            """
+        if os.path.exists(self.path):
+            self.file = np.lib.format.open_memmap(self.path, mode='r+')
+            return np.array(self.file)
+
+        # One-time migration from the old text format
+        if self.legacy_path is not None and os.path.exists(self.legacy_path):
+            game_map = np.loadtxt(self.legacy_path, dtype=np.uint8)
+            self.create(game_map)
+            return game_map
+
+        return None
+
+    def create(self, game_map):
+        """
+            Create the map file on disk from a game map
+            """
+        self.file = np.lib.format.open_memmap(
+            self.path, mode='w+', dtype=np.uint8, shape=game_map.shape)
+        self.file[:] = game_map
+        self.file.flush()
+
+    def start(self, game_map):
+        """
+            Start flushing the dirty regions of the game map in the background
+            """
+        self.game_map = game_map
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+            Stop the background thread and write any remaining changes
+            """
+        self.stopped.set()
+        self.flush()
+
+    def mark_dirty(self, x_start, x_end, y_start, y_end):
+        """
+            Mark a region of the game map as changed so it is written to disk
+            """
+        with self.lock:
+            if self.dirty is None:
+                self.dirty = [x_start, x_end, y_start, y_end]
+            else:
+                self.dirty = [min(self.dirty[0], x_start), max(self.dirty[1], x_end),
+                              min(self.dirty[2], y_start), max(self.dirty[3], y_end)]
+
+    def flush(self):
+        """
+            Copy the dirty region to the memory-mapped file and sync it
+            """
+        with self.lock:
+            if self.dirty is None or self.file is None:
+                return
+            x_start, x_end, y_start, y_end = self.dirty
+            self.dirty = None
+
+            self.file[x_start:x_end, y_start:y_end] = \
+                self.game_map[x_start:x_end, y_start:y_end]
+        self.file.flush()
+
+    def run(self):
+        """
+            Periodically flush the dirty region until stopped
+            """
+        while not self.stopped.wait(self.interval):
+            self.flush()
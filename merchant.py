@@ -4,10 +4,11 @@
 from enum import Enum
 from time import sleep
 import numpy as np
-import pyautogui
 import utilities as utils
+import wait
 from backpack import Backpack
 from user_interface import UserInterface
+from actions import INPUT
 
 class Merchant:
     """
@@ -88,8 +89,7 @@ class Merchant:
                 continue
 
             # Click on the merchant
-            pyautogui.moveTo(click_at[0], click_at[1], 0.15)
-            pyautogui.doubleClick()
+            INPUT.double_click(click_at[0], click_at[1])
 
             # Check that the buy or sell window was opened
             buy_or_sell = self.user_interface.wait_for_ui_element('buyOrSell', exit_on_fail=False)
@@ -135,28 +135,24 @@ class Merchant:
 
         # Click the buy button
         buy_button = self.user_interface.wait_for_ui_element('buy')
-        pyautogui.moveTo(buy_button[0] + 10, buy_button[1] + 10, 0.15)
-        pyautogui.click()
+        INPUT.click(buy_button[0] + 10, buy_button[1] + 10)
 
         # Wait for the buy menu to open
         self.user_interface.wait_for_ui_element('buyMenu')
 
         # Find the item to buy
         item_loc = self.user_interface.wait_for_ui_element(item)
-        pyautogui.moveTo(item_loc[0] + 6, item_loc[1] + 6, 0.15)
-        pyautogui.doubleClick()
+        INPUT.double_click(item_loc[0] + 6, item_loc[1] + 6)
 
         # Confirm the sale
         check_mark = self.user_interface.wait_for_ui_element('checkMark')
-        pyautogui.moveTo(check_mark[0] + 5, check_mark[1] + 5, 0.15)
-        pyautogui.click()
+        INPUT.click(check_mark[0] + 5, check_mark[1] + 5)
 
         # Click cancel to leave the window
         cancel = self.user_interface.wait_for_ui_element('cancel')
-        pyautogui.moveTo(cancel[0] + 5, cancel[1] + 5, 0.15)
-        pyautogui.click()
+        INPUT.click(cancel[0] + 5, cancel[1] + 5)
 
-        pyautogui.moveTo(400, 400)
+        INPUT.neutral()
         utils.log("INFO", F"Bought a {item}")
 
     def sell_item(self, item, merchant_type):
@@ -171,8 +167,7 @@ class Merchant:
 
         # Click the sell button
         sell_button = self.user_interface.wait_for_ui_element('sell')
-        pyautogui.moveTo(sell_button[0] + 10, sell_button[1] + 10, 0.15)
-        pyautogui.click()
+        INPUT.click(sell_button[0] + 10, sell_button[1] + 10)
 
         # Wait for the sell menu to open
         self.user_interface.wait_for_ui_element('sellMenu')
@@ -181,7 +176,7 @@ class Merchant:
         items_sold = 0
         for _ in range(12):
             # Move the cursor away so it will register an "hover" event when move back
-            pyautogui.moveTo(330, 206)
+            INPUT.move_to(330, 206)
 
             # Find a item to sell
             item_loc = self.user_interface.get_ui_element(item, exit_on_fail=False)
@@ -191,20 +186,22 @@ class Merchant:
                 utils.log("INFO", F"No {item} left to offer shopkeeper")
                 break
 
+            # Offer the item and wait for it to leave its slot. The slot is
+            # compared with the cursor away from it both times, so a hover
+            # highlight or tooltip doesn't count as the item leaving
             items_sold += 1
-            pyautogui.moveTo(item_loc[0] + 6, item_loc[1] + 12, 0.15)
-            pyautogui.doubleClick()
-            sleep(0.5)
+            offered = wait.region_changed((item_loc[0], item_loc[1], 12, 24))
+            INPUT.double_click(item_loc[0] + 6, item_loc[1] + 12)
+            INPUT.neutral()
+            wait.wait_until(offered, 0.5)
 
         # Confirm the sale
         check_mark = self.user_interface.wait_for_ui_element('checkMark')
-        pyautogui.moveTo(check_mark[0] + 5, check_mark[1] + 5, 0.15)
-        pyautogui.click()
+        INPUT.click(check_mark[0] + 5, check_mark[1] + 5)
 
         # Click cancel to leave the window
         cancel = self.user_interface.wait_for_ui_element('cancel')
-        pyautogui.moveTo(cancel[0] + 5, cancel[1] + 5, 0.15)
-        pyautogui.click()
+        INPUT.click(cancel[0] + 5, cancel[1] + 5)
 
         utils.log("INFO", F"Sold {items_sold} {item}(s)")
         return items_sold
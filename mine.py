@@ -20,25 +20,23 @@ class Mine():
         self.player = player
         self.mining_coords = None
 
-        # Load templates
-        self.templates = dict()
-        template = cv2.imread('./ui_elements/nothingToMine.png')
-        self.templates['nothingToMine'] = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-        template = cv2.imread('./ui_elements/cannotMineThere.png')
-        self.templates['cannotMineThere'] = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-
     def mine(self):
         """
             Mine ore until weight is nearing full.  If player destroys all pickaxes,
             another will be purchased and mining will continue.
             """
+        # Read the player's weight in the background while the backpack is
+        # searched for a pickaxe
+        self.player.request_weight()
+        pickaxe = self.player.backpack.get_item('pickaxe')
+
         # Get player's weight
         if self.player.is_weight_below_threshold(50):
             utils.log("INFO", F"Weight is below threshold, switching task to smelting")
             return self.player.TASKS.SMELT
 
         # No pickaxes left, buy one
-        if not self.player.backpack.get_item('pickaxe'):
+        if not pickaxe:
             self.merchant.buy_item('pickaxe', self.merchant.MERCHANTS.BLACKSMITH)
             self.mining_coords = self.move.go_to_mine()
         
@@ -47,7 +45,7 @@ class Mine():
             self.mining_coords = self.move.go_to_mine()
 
         # Check if there is still ore to mine here
-        screenshot = utils.take_screenshot()
+        screenshot = utils.take_screenshot(region='last_message')
         self.resolve_nothing_to_mine(screenshot)
         self.resolve_cannot_mine(screenshot)
 
@@ -79,13 +77,11 @@ class Mine():
 
     def check_last_message_for(self, message, screenshot):
         """
-            Check if the specified message was appended to the chat window
+            Check if the specified message was appended to the chat window,
+            given a capture of the last message region
             """
-        # Trim screenshot to just show last message
-        screenshot = screenshot[450: 480, 0: 170]
-
-        # Find macro template
-        result = cv2.matchTemplate(screenshot, self.templates[message], cv2.TM_CCORR_NORMED)
+        # Find the message template in the last message region
+        result = utils.match_template(screenshot, 'ui_elements/' + message)
         max_val = cv2.minMaxLoc(result)[1]
 
         # Message is displayed
@@ -4,9 +4,10 @@
 import random
 from time import sleep
 import numpy as np
-import pyautogui
-import astar
 import utilities as utils
+from planner import Planner
+from distance_field import DistanceField
+from actions import INPUT
 
 
 class Move:
@@ -21,6 +22,16 @@ class Move:
     ANVIL = (51, 217)
     MOUNTAIN_RANGE = (65, 207)
 
+    # Seconds to wait after a step key press
+    STEP_DELAY = 0.1
+
+    # Most steps taken on a straight segment before re-perceiving everything
+    MAX_SEGMENT = 8
+
+    # Destinations routed to constantly, each gets a cached distance field
+    FIXED_DESTINATIONS = (BANKER, POTION_SHOPKEEPER, ITEM_SHOPKEEPER, WEAPON_SHOPKEEPER,
+                          FURNACE, ANVIL, MOUNTAIN_RANGE)
+
     def __init__(self, game_map):
         # Notes on sextant usage::
         # Going left reduces x-values, going up reduces y-values
@@ -33,22 +44,126 @@ class Move:
         #   y-axis: 163 -> 240
         self.game_map = game_map
 
+        # Incremental search towards the current destination, repaired
+        # with the cells each map update changes
+        self.planner = None
+        self.game_map.add_change_listener(self.update_planner)
+
+        # Distance fields are shared by everything moving on this map
+        for destination in self.FIXED_DESTINATIONS:
+            if destination not in self.game_map.distance_fields:
+                field = DistanceField(self.game_map.game_map, destination)
+                self.game_map.distance_fields[destination] = field
+                self.game_map.add_change_listener(field.update_cells)
+
+    def get_planner(self, destination):
+        """
+            Returns the planner for a destination, keeping the search state
+            while the destination stays the same
+            """
+        if self.planner is None or self.planner.goal != destination:
+            self.planner = Planner(self.game_map.game_map, destination)
+        return self.planner
+
+    def update_planner(self, cells):
+        """
+            Pass the cells changed by a map update on to the planner
+            """
+        if self.planner is not None:
+            self.planner.update_cells(cells)
+
+    def distance_to(self, destination):
+        """
+            Returns how many steps a fixed destination is from the player,
+            or None if it is not a fixed destination or can't be reached
+            """
+        field = self.game_map.distance_fields.get(destination)
+        if field is None:
+            return None
+        return field.distance(self.game_map.player_position)
+
+    def next_step(self, destination):
+        """
+            Returns the next cell to step to on the way to the destination.
+            Fixed destinations follow their distance field, anything else or
+            a step blocked by an NPC falls back to the planner
+            """
+        field = self.game_map.distance_fields.get(destination)
+        if field is not None:
+            step_to = field.next_step(self.game_map.player_position)
+            if step_to is not None:
+                return step_to
+
+        path = self.get_planner(destination).get_path(self.game_map.player_position)
+        if not path:
+            return None
+        return path[0]
+
+    def next_segment(self, destination, step_to):
+        """
+            Returns the straight run of cells, starting with step_to, that the
+            route to the destination follows. Runs are a single step when an
+            NPC is near, so they are walked with full perception
+            """
+        x_step = step_to[0] - self.game_map.player_position[0]
+        y_step = step_to[1] - self.game_map.player_position[1]
+        # The route either goes down the distance field or follows the planner's path
+        field = self.game_map.distance_fields.get(destination)
+        if field is not None and field.distance(step_to) is None:
+            field = None
+        route = set()
+        if field is None:
+            route = set(self.get_planner(destination).get_path(self.game_map.player_position) or [])
+
+        segment = [step_to]
+        while len(segment) < self.MAX_SEGMENT:
+            previous = segment[-1]
+            ahead = (previous[0] + x_step, previous[1] + y_step)
+            if not (0 <= ahead[0] < self.game_map.game_map.shape[0] and
+                    0 <= ahead[1] < self.game_map.game_map.shape[1]):
+                break
+            if self.game_map.game_map[ahead] >= self.game_map.TILES.INACCESSIBLE.value:
+                break
+            if field is not None:
+                on_route = field.distances[ahead] == field.distances[previous] - 1
+            else:
+                on_route = ahead in route
+            if not on_route:
+                break
+            segment.append(ahead)
+
+        if self.npc_near(segment):
+            return segment[:1]
+        return segment
+
+    def npc_near(self, cells):
+        """
+            Checks if an NPC is on or beside any of the cells
+            """
+        npcs = (self.game_map.TILES.WEAPON_SHOPKEEPER.value, self.game_map.TILES.BLACKSMITH.value)
+        for x, y in cells:
+            around = self.game_map.game_map[(x - 1):(x + 2), (y - 1):(y + 2)]
+            if np.isin(around, npcs).any():
+                return True
+        return False
+
     def move_to(self, destination, mining=False):
         """
-            Finds a path from the players position to the destination using the aStar
-            shortest path algorithm.  Once a path is found, the player takes a step.
-            After each step, the surroundings are examined again and a new path is
-            calculated. This extra work is required because obstacles such as the shopkeepers
+            Finds the next step from the players position to the destination using the
+            cached distance fields or the D* Lite incremental planner.  Once a step is
+            found, the player takes it.
+            After each step, the surroundings are examined again and the path is
+            repaired. This extra work is required because obstacles such as the shopkeepers
             can move and impede the players movement.
             """
         error = 0
         turns_without_moving = 0
         while not self.game_map.player_position == destination:
-            # Find a path to the destination
-            path = astar.get_path(self.game_map.game_map, self.game_map.player_position, destination)
+            # Find the next step towards the destination
+            step_to = self.next_step(destination)
 
             # Failed to get a path, retry up to 3 times
-            if not path:
+            if step_to is None:
                 error += 1
                 utils.log("WARN", F"Failed to get path from {self.game_map.player_position} to {destination}")
 
@@ -84,13 +199,13 @@ class Move:
             # Reset error count
             error = 0
 
-            # Get the next move from the path
-            step_to = path[0]
-            destination = path[-1]
-
-            # Take a step towards the destination
+            # Take a step, or a straight run of steps, towards the destination
             previous_position = self.game_map.player_position
-            self.step(step_to)
+            segment = self.next_segment(destination, step_to)
+            if len(segment) > 1:
+                self.walk_segment(segment)
+            else:
+                self.step(step_to)
 
             # Check if the player has gone several turns without movement
             if previous_position == self.game_map.player_position:
@@ -106,10 +221,38 @@ class Move:
                 utils.quit_game()
         return True
 
-    def step(self, new_position):
+    def walk_segment(self, segment):
         """
-            Given a set of coordinates, calculate what direction to step
-            and send that key to the game
+            Walk a straight run of cells by sending the key presses in
+            sequence. Before each press only the tile ahead is checked and
+            after it the position is tracked from the frame shift. The map
+            update is done once, at the end
+            """
+        direction = self.direction_to(segment[0])
+        x_step = segment[0][0] - self.game_map.player_position[0]
+        y_step = segment[0][1] - self.game_map.player_position[1]
+
+        for cell in segment:
+            # Stop early if something now blocks the tile ahead
+            before = utils.take_screenshot(region='play')
+            if self.game_map.peek_tile(x_step, y_step, before) >= self.game_map.TILES.INACCESSIBLE.value:
+                utils.log("INFO", F"Tile {cell} is blocked, stopping segment")
+                break
+
+            INPUT.press(direction)
+            sleep(self.STEP_DELAY)
+            self.game_map.track_step(direction, before, utils.take_screenshot(region='play'))
+
+            if self.game_map.player_position != cell:
+                utils.log("WARN", F"Expected to reach {cell}, at {self.game_map.player_position}")
+                break
+
+        # Re-detect environment
+        self.game_map.update_map()
+
+    def direction_to(self, new_position):
+        """
+            Returns the key to press to step to an adjacent position
             """
         # Calculate direction of movement
         x_diff = self.game_map.player_position[0] - new_position[0]
@@ -130,14 +273,28 @@ class Move:
                 'SEVERE', F"Invalid step difference. xDiff: {x_diff}, yDiff: {y_diff}")
             utils.quit_game()
 
+        return direction
+
+    def step(self, new_position):
+        """
+            Given a set of coordinates, calculate what direction to step
+            and send that key to the game
+            """
+        direction = self.direction_to(new_position)
+
         # Move along path
-        pyautogui.press(direction)
-        sleep(0.1)
+        before = utils.take_screenshot(region='play')
+        INPUT.press(direction)
+        sleep(self.STEP_DELAY)
 
         # Player moved, re-detect environment
-        screenshot = utils.take_screenshot()
-        self.game_map.update_player_position(screenshot)
-        self.game_map.update_map()
+        self.game_map.track_step(direction, before, utils.take_screenshot(region='play'))
+
+        # Only the revealed strip needs classifying if the step went as planned
+        if self.game_map.player_position == new_position:
+            self.game_map.update_map(direction=direction)
+        else:
+            self.game_map.update_map()
 
     def go_to_mine(self):
         """
@@ -0,0 +1,138 @@
+"""
+    This module runs Tesseract in-process. One engine is kept alive per
+    configuration so reads only pay for recognition, not for starting the
+    tesseract binary and loading its language data
+    """
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from logger import LOGGER
+
+# Threads reading in the background. Tesseract releases the GIL while it
+# recognizes, so reads overlap with the control loop
+OCR_WORKERS = 2
+
+
+def parse_config(config):
+    """
+        Splits a pytesseract config string, e.g. '--psm 6 -c key=value',
+        into the page segmentation mode and a dict of variables
+        """
+    psm = None
+    variables = dict()
+    arguments = shlex.split(config)
+    for i, argument in enumerate(arguments):
+        if argument == '--psm':
+            psm = int(arguments[i + 1])
+        elif argument == '-c':
+            key, value = arguments[i + 1].split('=', 1)
+            variables[key] = value
+    return psm, variables
+
+
+class TesseractEngine:
+    """
+        A long-lived Tesseract instance reached through the C API
+        bindings. Images are handed over as raw pixel buffers
+        """
+
+    def __init__(self, config):
+        # tesserocr is only needed when it is installed
+        import tesserocr
+        psm, variables = parse_config(config)
+        if psm is None:
+            self.api = tesserocr.PyTessBaseAPI()
+        else:
+            self.api = tesserocr.PyTessBaseAPI(psm=psm)
+        for key, value in variables.items():
+            self.api.SetVariable(key, value)
+
+        # One engine can only read one image at a time
+        self.lock = threading.Lock()
+
+    def image_to_string(self, image):
+        """
+            Returns the text in a grayscale or BGR image
+            """
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image = np.ascontiguousarray(image)
+        channels = 1 if image.ndim == 2 else 3
+
+        with self.lock:
+            self.api.SetImageBytes(image.tobytes(), image.shape[1], image.shape[0],
+                                   channels, image.shape[1] * channels)
+            return self.api.GetUTF8Text()
+
+
+class SubprocessEngine:
+    """
+        Starts the tesseract binary for every read through pytesseract, used
+        when the C API bindings are not installed
+        """
+
+    def __init__(self, config):
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.config = config
+
+    def image_to_string(self, image):
+        """
+            Returns the text in a grayscale or BGR image
+            """
+        return self.pytesseract.image_to_string(image, config=self.config)
+
+
+class OCRService:
+    """
+        Hands out one engine per configuration, creating it on first use
+        """
+
+    def __init__(self):
+        self.engines = dict()
+        self.lock = threading.Lock()
+
+    def get_engine(self, config):
+        """
+            Returns the engine for a configuration. Falls back to pytesseract
+            when tesserocr is unavailable or fails to start
+            """
+        with self.lock:
+            if config not in self.engines:
+                try:
+                    self.engines[config] = TesseractEngine(config)
+                except ImportError:
+                    self.engines[config] = SubprocessEngine(config)
+                except Exception as exception:
+                    LOGGER.log("WARN", F"Tesseract engine failed to start ({exception}), "
+                                       F"falling back to pytesseract")
+                    self.engines[config] = SubprocessEngine(config)
+            return self.engines[config]
+
+    def image_to_string(self, image, config=''):
+        """
+            Returns the text in an image, read with the engine for a configuration
+            """
+        return self.get_engine(config).image_to_string(image)
+
+
+OCR = OCRService()
+
+
+def image_to_string(image, config=''):
+    """
+        Reads an image with the shared service
+        """
+    return OCR.image_to_string(image, config)
+
+
+POOL = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='ocr')
+
+
+def submit(function, *args):
+    """
+        Runs a read in the background, returns a future for its result
+        """
+    return POOL.submit(function, *args)
@@ -0,0 +1,211 @@
+"""
+    This module keeps an incremental (D* Lite) search towards a single
+    destination so the path can be repaired after map changes instead of
+    being searched for from scratch
+    """
+from heapq import heappush, heappop
+import astar
+from game_map import GameMap
+
+INFINITY = float('inf')
+
+
+class Planner:
+    """
+        D* Lite search from the destination back to the player. The search
+        state is kept between calls, changed cells only update the part of
+        the search they affect
+        """
+
+    def __init__(self, game_map, goal):
+        self.game_map = game_map
+        self.goal = goal
+        self.height, self.width = game_map.shape
+        self.goal_index = goal[0] * self.width + goal[1]
+
+        size = self.height * self.width
+        self.passable = bytearray(self.traversable(game_map).tobytes())
+        self.g_score = [INFINITY] * size
+        self.rhs = [INFINITY] * size
+        self.rhs[self.goal_index] = 0
+
+        # Priority queue with lazy deletion, queued holds each cell's live key
+        self.open_heap = []
+        self.queued = dict()
+
+        # Key modifier so keys stay valid as the player moves
+        self.k_m = 0
+        self.last_start = None
+
+        self.push(self.goal_index, self.calculate_key(self.goal_index))
+
+    @staticmethod
+    def traversable(game_map):
+        """
+            Cells the player can walk on. The player's own cell counts as
+            walkable so moving around does not change the search
+            """
+        return (game_map < GameMap.TILES.INACCESSIBLE.value) | \
+            (game_map == GameMap.TILES.PLAYER.value)
+
+    def heuristic(self, index):
+        """
+            Manhattan distance from the player to a cell. Zero, a valid lower
+            bound, until the player's position is known
+            """
+        if self.last_start is None:
+            return 0
+        x, y = divmod(index, self.width)
+        return abs(self.last_start[0] - x) + abs(self.last_start[1] - y)
+
+    def neighbours(self, index):
+        """
+            Returns the cells next to a cell
+            """
+        x, y = divmod(index, self.width)
+        neighbours = []
+        if y + 1 < self.width:
+            neighbours.append(index + 1)
+        if y > 0:
+            neighbours.append(index - 1)
+        if x + 1 < self.height:
+            neighbours.append(index + self.width)
+        if x > 0:
+            neighbours.append(index - self.width)
+        return neighbours
+
+    def calculate_key(self, index):
+        """
+            Priority of a cell in the queue
+            """
+        best = min(self.g_score[index], self.rhs[index])
+        return (best + self.heuristic(index) + self.k_m, best)
+
+    def push(self, index, key):
+        """
+            Queue a cell, replacing any key it was queued with
+            """
+        self.queued[index] = key
+        heappush(self.open_heap, (key, index))
+
+    def top(self):
+        """
+            Returns the lowest live (key, cell) in the queue, dropping stale entries
+            """
+        while self.open_heap:
+            key, index = self.open_heap[0]
+            if self.queued.get(index) == key:
+                return key, index
+            heappop(self.open_heap)
+        return (INFINITY, INFINITY), None
+
+    def update_vertex(self, index):
+        """
+            Recompute a cell's one-step lookahead cost and requeue it if it
+            is inconsistent
+            """
+        if index != self.goal_index:
+            best = INFINITY
+            if self.passable[index]:
+                for neighbour in self.neighbours(index):
+                    if self.passable[neighbour] and self.g_score[neighbour] + 1 < best:
+                        best = self.g_score[neighbour] + 1
+            self.rhs[index] = best
+
+        self.queued.pop(index, None)
+        if self.g_score[index] != self.rhs[index]:
+            self.push(index, self.calculate_key(index))
+
+    def compute_shortest_path(self, start_index):
+        """
+            Process the queue until the player's cell is consistent
+            """
+        while True:
+            key, index = self.top()
+            if index is None:
+                return
+            if key >= self.calculate_key(start_index) and \
+                    self.rhs[start_index] == self.g_score[start_index]:
+                return
+
+            new_key = self.calculate_key(index)
+            if key < new_key:
+                # Key is out of date, requeue it
+                self.push(index, new_key)
+                continue
+
+            heappop(self.open_heap)
+            del self.queued[index]
+
+            if self.g_score[index] > self.rhs[index]:
+                # Overconsistent, the cell got cheaper
+                self.g_score[index] = self.rhs[index]
+                for neighbour in self.neighbours(index):
+                    self.update_vertex(neighbour)
+            else:
+                # Underconsistent, the cell got more expensive
+                self.g_score[index] = INFINITY
+                self.update_vertex(index)
+                for neighbour in self.neighbours(index):
+                    self.update_vertex(neighbour)
+
+    def update_cells(self, cells):
+        """
+            Tell the planner which (x, y) cells of the map changed. Only
+            cells whose walkability changed affect the search
+            """
+        for x, y in cells:
+            index = x * self.width + y
+            passable = 1 if self.traversable(self.game_map[x, y]) else 0
+            if passable == self.passable[index]:
+                continue
+
+            self.passable[index] = passable
+            self.update_vertex(index)
+            for neighbour in self.neighbours(index):
+                self.update_vertex(neighbour)
+
+    def get_path(self, start):
+        """
+            Returns the path from start to the destination, excluding the
+            start, in the same form as astar.get_path. Returns None when
+            there is no path
+            """
+        # Blocked destination, e.g. an NPC is standing on it
+        if not self.passable[self.goal_index]:
+            return None
+
+        if self.last_start is None:
+            self.last_start = start
+        elif start != self.last_start:
+            self.k_m += abs(start[0] - self.last_start[0]) + abs(start[1] - self.last_start[1])
+            self.last_start = start
+
+        start_index = start[0] * self.width + start[1]
+        self.compute_shortest_path(start_index)
+
+        if self.g_score[start_index] == INFINITY:
+            return None
+
+        # Follow the cheapest neighbours down to the destination
+        path = []
+        current = start_index
+        while current != self.goal_index:
+            best = None
+            for neighbour in self.neighbours(current):
+                if self.passable[neighbour] and \
+                        (best is None or self.g_score[neighbour] < self.g_score[best]):
+                    best = neighbour
+            if best is None or self.g_score[best] == INFINITY:
+                return None
+
+            # Only the start is guaranteed consistent, if the scores stop
+            # decreasing search the rest of the way from scratch
+            if self.g_score[best] >= self.g_score[current]:
+                rest = astar.get_path(self.game_map, divmod(current, self.width), self.goal)
+                return None if rest is None else path + rest
+
+            current = best
+            path.append(divmod(current, self.width))
+
+        return path
@@ -4,6 +4,8 @@
 from enum import Enum
 from time import sleep
 import utilities as utils
+from actions import INPUT
+from logger import LOGGER
 from user_interface import UserInterface
 from backpack import Backpack
 from mine import Mine
@@ -28,6 +30,9 @@ class Player():
         self.task = task
         self.action_count = 0
 
+        # Weight read started in the background, collected when it is needed
+        self.weight_request = None
+
     def perform_task(self):
         """
             Checks health, organizes backpack and then performs
@@ -41,30 +46,36 @@ class Player():
             self.action_count = 0
             self.check_health()
 
-        # Perform task
+        # Input sent from here on counts towards the current task
+        task = self.task
+        INPUT.task = task
+        LOGGER.context['task'] = task.name
+
+        # Perform task, each waits for its action to complete
         if self.task == self.TASKS.MINE:
             self.task = self.mine.mine()
-            delay = 0
         elif self.task == self.TASKS.SMELT:
             self.task = self.smelt.smelt()
-            delay = 1.4
         elif self.task == self.TASKS.FORGE:
             self.task = self.forge.forge()
-            delay = 2.1
-
-        # Give the task time to complete
-        sleep(delay)
 
         # Organize backpack now that items have been potentially added
         self.organize_backpack()
 
+        # Report how long the finished task spent sending input
+        if self.task != task:
+            input_time = INPUT.take_timing(task)
+            utils.log("INFO", F"{task.name} spent {input_time:.1f}s sending input",
+                      input_seconds=round(input_time, 3))
+
     def check_health(self):
         """
             Checks player's HP and uses a potion if it is low.
             If no potions are found, game will quit
             """
         # Check if HP is low
-        if self.user_interface.get_health() < self.LOW_HEALTH:
+        health = self.user_interface.get_health()
+        if health < self.LOW_HEALTH:
             # Attempt to use a potion
             utils.log("INFO", F"Health dropped below {self.LOW_HEALTH}")
             used_potion = self.backpack.use_item('potion', offset=(4, 9))
@@ -85,9 +96,20 @@ class Player():
             utils.log("INFO", F"Used a potion")
             sleep(6)
 
+    def request_weight(self):
+        """
+            Start reading the player's weight in the background, the next
+            weight check uses the result
+            """
+        self.weight_request = self.user_interface.request_weight()
+
     def is_weight_below_threshold(self, threshold):
+        """
+            Checks if the player can carry less than threshold more weight
+            """
         # Calculate how much more weight the player can carry
-        current_weight, max_weight = self.user_interface.get_weight()
+        current_weight, max_weight = self.user_interface.get_weight(self.weight_request)
+        self.weight_request = None
         difference = max_weight - current_weight
 
         # Check if the weight the player can carry is below the threshold
@@ -101,12 +123,4 @@ class Player():
         """
             Move all items to the correct areas of the backpack
             """
-        self.backpack.move_item('ore', self.backpack.ORE_LOC, (8, 6))
-        self.backpack.move_item('gem', self.backpack.GEM_LOC, (4, 2))
-        self.backpack.move_item('jewel', self.backpack.GEM_LOC, (4, 2))
-        self.backpack.move_item('galantine', self.backpack.GEM_LOC, (5, 4))
-        self.backpack.move_item('pickaxe', self.backpack.PICKAXE_LOC, (9, 4))
-        self.backpack.move_item('dagger', self.backpack.DAGGER_LOC, (4, 6))
-        self.backpack.move_item('hammer', self.backpack.HAMMER_LOC, (7, 3))
-        self.backpack.move_item('gold', self.backpack.GEM_LOC, (6, 5))
-        self.backpack.move_item('ingot', self.backpack.INGOT_LOC)
\ No newline at end of file
+        self.backpack.organize()
@@ -0,0 +1,89 @@
+"""
+    This module tracks the player position by dead reckoning. Each step is
+    predicted from the key pressed and confirmed by how far the play region
+    shifted between the frames before and after it
+    """
+import numpy as np
+import cv2
+
+# Pixels the play region scrolls by for one step
+TILE_DIM = 16
+
+# Change in (x, y) for each movement key
+KEY_STEPS = {'a': (-1, 0), 'd': (1, 0), 'w': (0, -1), 's': (0, 1)}
+
+# Pixels a measured shift may be off by and still count as a match
+SHIFT_TOLERANCE = 4
+
+# Phase correlation peaks weaker than this are not trusted on their own
+MIN_RESPONSE = 0.1
+
+# Below this confidence the sextant has to be read
+MIN_CONFIDENCE = 0.5
+
+# Steps tracked before the sextant is read anyway
+SEXTANT_INTERVAL = 50
+
+
+class PositionTracker:
+    """
+        Dead-reckoned player position. Confidence starts at zero, so the
+        first position has to come from the sextant. It is lowered by weak
+        or unexpected frame shifts and restored by each sextant reading
+        """
+
+    def __init__(self):
+        self.confidence = 0.0
+        self.steps = 0
+        self.window = None
+
+    def confirm(self):
+        """
+            Record that the position was just read from the sextant
+            """
+        self.confidence = 1.0
+        self.steps = 0
+
+    def measure_shift(self, before, after):
+        """
+            Returns the (x, y) pixel shift of the play region between two
+            grayscale frames and the strength of the correlation peak
+            """
+        before = np.float32(before)
+        after = np.float32(after)
+        if self.window is None or self.window.shape != before.shape:
+            self.window = cv2.createHanningWindow(before.shape[::-1], cv2.CV_32F)
+        shift, response = cv2.phaseCorrelate(before, after, self.window)
+        return shift, response
+
+    def track(self, position, direction, before, after):
+        """
+            Returns the position after pressing the direction key, given the
+            play region before and after the press. Returns None when the
+            tracker is not confident and the sextant should be read
+            """
+        if self.confidence < MIN_CONFIDENCE or self.steps >= SEXTANT_INTERVAL:
+            return None
+        self.steps += 1
+
+        (x_shift, y_shift), response = self.measure_shift(before, after)
+        x_step, y_step = KEY_STEPS[direction]
+
+        # The world scrolls the opposite way to the player
+        if abs(x_shift + x_step * TILE_DIM) <= SHIFT_TOLERANCE and \
+                abs(y_shift + y_step * TILE_DIM) <= SHIFT_TOLERANCE:
+            new_position = (position[0] + x_step, position[1] + y_step)
+        elif abs(x_shift) <= SHIFT_TOLERANCE and abs(y_shift) <= SHIFT_TOLERANCE:
+            # Bumped into something, the player did not move
+            new_position = position
+        else:
+            # The view moved in a way a single step can't explain
+            self.confidence = 0.0
+            return None
+
+        if response < MIN_RESPONSE:
+            self.confidence /= 2
+            if self.confidence < MIN_CONFIDENCE:
+                return None
+
+        return new_position
@@ -1,11 +1,11 @@
 """
     This module performs smelting related tasks
     """
-from time import sleep
-import pyautogui
 import cv2
 import utilities as utils
+import wait
 from move import Move
+from actions import INPUT
 
 
 class Smelt():
@@ -16,28 +16,19 @@ class Smelt():
         self.move = Move(game_map)
         self.player = player
 
-        # Load smelter template
-        cold_forge_template = cv2.imread('./inaccessible_tiles/coldForge.png')
-        self.cold_forge_template = cv2.cvtColor(
-            cold_forge_template, cv2.COLOR_BGR2GRAY)
-
     def fire_smelter(self):
         """
             Check if the forge has gone cold. If so, fires it
             """
-        # Get the smelter
-        screenshot = utils.take_screenshot()
-        forge = screenshot[152:168, 168:184]
-
-        # Check if the cold forge exists
-        result = cv2.matchTemplate(forge, self.cold_forge_template, cv2.TM_CCORR_NORMED)
+        # Check if the cold forge exists where the smelter is
+        smelter = utils.take_screenshot(region='smelter')
+        result = utils.match_template(smelter, 'inaccessible_tiles/coldForge')
         max_val = cv2.minMaxLoc(result)[1]
 
-        # Found cold forge, light it and wait
+        # Found cold forge, light it and wait until it is no longer cold
         if max_val > 0.9:
-            pyautogui.moveTo(192, 159, 0.15)
-            pyautogui.doubleClick()
-            sleep(1.5)
+            INPUT.double_click(192, 159)
+            wait.wait_until(wait.template_vanished('inaccessible_tiles/coldForge', 'smelter'), 1.5)
 
     def smelt(self):
         """
@@ -55,8 +46,10 @@ class Smelt():
         # Fire the smelter if it is cold
         self.fire_smelter()
 
-        # Smelt the ore
+        # Smelt the ore and wait for it to be used up
+        ore_used = wait.item_count_changed(self.player.backpack, 'ore')
         self.player.backpack.use_item('ore', (176, 161), (8, 6))
+        wait.wait_until(ore_used, 1.4)
 
         # Continue smelting
         return self.player.TASKS.SMELT
@@ -0,0 +1,79 @@
+"""
+    This module loads every template image once and shares it between
+    all classes. Templates are looked up by name, e.g. 'ui_elements/icon'
+    """
+import os
+import cv2
+
+TEMPLATE_DIRECTORIES = ('ui_elements', 'backpack_items', 'accessible_tiles',
+                        'inaccessible_tiles', 'npcs')
+
+
+class TemplateRegistry:
+    """
+        Holds the colour and grayscale variant of every template. Each
+        directory is read the first time one of its templates is needed
+        """
+
+    def __init__(self, root='.'):
+        self.root = root
+        self.colour = dict()
+        self.grayscale = dict()
+        self.directories = dict()
+
+    def load(self, directory):
+        """
+            Load every template in a directory, returning their names
+            """
+        if directory in self.directories:
+            return self.directories[directory]
+
+        names = []
+        path = os.path.join(self.root, directory)
+        for file_name in sorted(f for f in os.listdir(path) if f.endswith('.png')):
+            name = directory + '/' + file_name.split('.')[0]
+            colour = cv2.imread(os.path.join(path, file_name))
+            grayscale = cv2.cvtColor(colour, cv2.COLOR_BGR2GRAY)
+
+            # Templates are shared by every class, nobody may modify them
+            colour.setflags(write=False)
+            grayscale.setflags(write=False)
+
+            self.colour[name] = colour
+            self.grayscale[name] = grayscale
+            names.append(name)
+
+        self.directories[directory] = names
+        return names
+
+    def names(self, directory):
+        """
+            Returns the names of every template in a directory
+            """
+        return list(self.load(directory))
+
+    def get(self, name, grayscale=False):
+        """
+            Returns a template by name, in colour or grayscale
+            """
+        self.load(name.split('/')[0])
+        if grayscale:
+            return self.grayscale[name]
+        return self.colour[name]
+
+
+TEMPLATES = TemplateRegistry()
+
+
+def get(name, grayscale=False):
+    """
+        Returns a template from the shared registry
+        """
+    return TEMPLATES.get(name, grayscale)
+
+
+def names(directory):
+    """
+        Returns the names of every template in a directory of the shared registry
+        """
+    return TEMPLATES.names(directory)
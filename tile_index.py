@@ -0,0 +1,178 @@
+"""
+    This module indexes the tile templates by hash so that tiles in the
+    gameplay region are recognised with a single lookup instead of a scan
+    over every template
+    """
+import numpy as np
+import templates
+
+TILE_DIM = 16
+GRID_DIM = 21
+TILE_DIRECTORIES = ('accessible_tiles', 'inaccessible_tiles', 'npcs')
+
+# Odd 64-bit weights, a tile's hash is its dot product with them modulo 2**64
+HASH_WEIGHTS = np.random.RandomState(3156).randint(
+    0, 2**62, size=TILE_DIM * TILE_DIM, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+
+
+def load_templates():
+    """
+        Returns the accessible, inaccessible and NPC tile templates as a list
+        of [grayscale template, name] in the order they are compared
+        """
+    tile_templates = []
+    for directory in TILE_DIRECTORIES:
+        for name in templates.names(directory):
+            tile_templates.append([templates.get(name, True), name])
+    return tile_templates
+
+
+def tile_hash(tiles):
+    """
+        Returns the exact hash of a 16x16 tile, or of every tile in an
+        (..., 16, 16) array of tiles
+        """
+    flat = tiles.reshape(tiles.shape[:-2] + (TILE_DIM * TILE_DIM,))
+    return (flat.astype(np.uint64) * HASH_WEIGHTS).sum(axis=-1, dtype=np.uint64)
+
+
+def grid_view(play):
+    """
+        Returns the 336x336 play region as a (21, 21, 16, 16) view of its
+        tiles, indexed [x, y] like the game map. No pixels are copied
+        """
+    tiles = play.reshape(GRID_DIM, TILE_DIM, GRID_DIM, TILE_DIM)
+    return tiles.transpose(2, 0, 1, 3)
+
+
+class TileIndex:
+    """
+        Maps tile hashes to the template the tile is recognised as. Hashes
+        that miss are resolved with the tolerant template scan once and the
+        answer, match or not, is remembered
+        """
+
+    def __init__(self, tile_templates):
+        self.templates = tile_templates
+        self.index = dict()
+        self.misses = 0
+
+        # Templates stacked into one tensor for batch scans
+        self.stack = np.array([template for template, _ in self.templates],
+                              dtype=np.int16).reshape(-1, TILE_DIM, TILE_DIM)
+
+        # Sorted copy of the index for vectorized lookups, rebuilt after misses
+        self.sorted_hashes = None
+        self.sorted_matches = None
+
+        # Seed the index with every template. A template is recognised as the
+        # first template it matches so lookups agree with the linear scan
+        for template, _ in self.templates:
+            key = int(tile_hash(template))
+            if key not in self.index:
+                self.index[key] = self.scan(template)
+
+    def scan(self, tile):
+        """
+            Compare the tile with every template in order, returning the
+            index of the first close match or -1 when nothing matches
+            """
+        for i, (template, _) in enumerate(self.templates):
+            if np.allclose(template, tile, 1, 1):
+                return i
+        return -1
+
+    def lookup(self, tile):
+        """
+            Returns the [template, name] the tile is recognised as, or None
+            """
+        match = self.match(tile)
+        if match < 0:
+            return None
+        return self.templates[match]
+
+    def match(self, tile):
+        """
+            Returns the index of the template the tile is recognised as, or -1
+            """
+        key = int(tile_hash(tile))
+        match = self.index.get(key)
+
+        # Unseen tile art, fall back to the tolerant comparison once
+        if match is None:
+            self.misses += 1
+            match = self.scan(tile)
+            self.index[key] = match
+            self.sorted_hashes = None
+
+        return match
+
+    def scan_batch(self, tiles):
+        """
+            Compare an (N, 16, 16) array of tiles with every template in one
+            operation. Returns, for each tile, the index of the first close
+            match or -1 when nothing matches
+            """
+        if len(self.templates) == 0:
+            return np.full(len(tiles), -1)
+
+        # Same tolerance as np.allclose(template, tile, 1, 1)
+        candidates = tiles.astype(np.int16)[:, np.newaxis]
+        close = np.abs(self.stack[np.newaxis] - candidates) <= 1 + candidates
+        matched = close.all(axis=(2, 3))
+
+        return np.where(matched.any(axis=1), matched.argmax(axis=1), -1)
+
+    def classify_grid(self, play, mask=None):
+        """
+            Classify the tiles of the play region in one call. Returns a
+            (21, 21) grid, indexed [x, y], of template indices with -1 for
+            unrecognised tiles and for cells excluded by the mask
+            """
+        tiles = grid_view(play)
+        if mask is None:
+            mask = np.ones((GRID_DIM, GRID_DIM), dtype=bool)
+
+        grid = np.full((GRID_DIM, GRID_DIM), -1)
+        candidates = tiles[mask]
+        if len(candidates) == 0:
+            return grid
+
+        # Resolve every tile whose hash is already in the index
+        hashes = tile_hash(candidates)
+        matches, found = self.lookup_hashes(hashes)
+
+        # Scan each unseen tile art once and remember the answer
+        if not found.all():
+            self.misses += int(np.count_nonzero(~found))
+            missed, first, inverse = np.unique(
+                hashes[~found], return_index=True, return_inverse=True)
+            scanned = self.scan_batch(candidates[~found][first])
+            matches[~found] = scanned[inverse.ravel()]
+
+            for key, match in zip(missed.tolist(), scanned.tolist()):
+                self.index[key] = match
+            self.sorted_hashes = None
+
+        grid[mask] = matches
+        return grid
+
+    def lookup_hashes(self, hashes):
+        """
+            Look up an array of tile hashes. Returns the template indices and
+            a mask of the hashes that were found in the index
+            """
+        if self.sorted_hashes is None:
+            keys = np.fromiter(self.index.keys(), dtype=np.uint64, count=len(self.index))
+            values = np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index))
+            order = np.argsort(keys)
+            self.sorted_hashes = keys[order]
+            self.sorted_matches = values[order]
+
+        if len(self.sorted_hashes) == 0:
+            return np.full(len(hashes), -1), np.zeros(len(hashes), dtype=bool)
+
+        positions = np.searchsorted(self.sorted_hashes, hashes)
+        positions = np.minimum(positions, len(self.sorted_hashes) - 1)
+        found = self.sorted_hashes[positions] == hashes
+        return np.where(found, self.sorted_matches[positions], -1), found
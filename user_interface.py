@@ -2,53 +2,40 @@
 """
     This module handles everything user interface related
     """
-import os
-from time import sleep
 import cv2
-import pytesseract
-import pyautogui
 import utilities as utils
+import wait
+from actions import INPUT
 
 class UserInterface:
     """
         This class handles everything user interface related
         """
 
-    def __init__(self):
-        # Load all UI element templates
-        self.templates = dict()
-        for tile in os.listdir('./ui_elements'):
-            tile_template = cv2.imread('./ui_elements/' + tile)
-            self.templates[tile.split('.')[0]] = tile_template
-
     def wait_for_ui_element(self, element, exit_on_fail=True):
         """
             Some elements take time to appear after an event, typically a click, was sent.
-            This method will attempt to find a UI element on the screen 10 times. After each
-            failed attempt, it will delay 0.5 seconds and try again.
+            This method will poll the screen for a UI element for up to 5 seconds, checking
+            quickly at first and backing off the longer it takes.
 
-            If the element is not found after 10 attempts, it will either quit the game or
+            If the element is not found in time, it will either quit the game or
             return false depending on the value of exit_on_fail.
 
             An example of when to use this method is after clicking on a merchant, the "Buy
             or sell" window can take some time to appear on screen.
             """
-        attempts = 0
-        element_loc = None
-        while attempts < 20:
-            # Try and click on the merchant
-            element_loc = self.get_ui_element(element, exit_on_fail=False)
-
-            # Found the element
-            if element_loc:
-                return element_loc
-
-            sleep(0.25)
-            attempts += 1
-
-        # Failed to find the UI element after 10 attempts
-        if not element_loc and exit_on_fail:
-            utils.log("SEVERE", F"Failed to find {element} after waiting and searching 20 times")
+        # Move the mouse so it doesn't obstruct search
+        INPUT.neutral()
+
+        element_loc = wait.wait_until(wait.template_appeared('ui_elements/' + element), 5)
+
+        # Found the element
+        if element_loc:
+            return element_loc
+
+        # Failed to find the UI element in time
+        if exit_on_fail:
+            utils.log("SEVERE", F"Failed to find {element} after waiting 5 seconds")
             utils.quit_game()
 
         # Failed to find element but failure will be handled elsewhere
@@ -59,14 +46,14 @@ class UserInterface:
             Find a UI element on the screen
             """
         # Move the mouse so it doesn't obstruct search
-        pyautogui.moveTo(400, 400)
+        INPUT.neutral()
 
         # Get a screenshot
         if screenshot is None:
             screenshot = utils.take_screenshot(False)
 
         # Try to match the template in the screenshot
-        result = cv2.matchTemplate(screenshot, self.templates[element], cv2.TM_CCORR_NORMED)
+        result = utils.match_template(screenshot, 'ui_elements/' + element)
         _, max_val, _, max_loc = cv2.minMaxLoc(result)
 
         # Found the element, return the location
@@ -81,26 +68,40 @@ class UserInterface:
         utils.log("SEVERE", F"Failed to find {element}, max confidence was {max_val}")
         utils.quit_game()
 
-    def get_weight(self):
+    @staticmethod
+    def prepare_readout(readout):
         """
-            Gets the player's current and max weight
+            Resize, denoise and threshold a health or weight readout for Tesseract
+            """
+        readout = cv2.resize(readout, (0, 0), fx=3, fy=3)
+        readout = cv2.cvtColor(readout, cv2.COLOR_BGR2GRAY)
+        readout = cv2.bitwise_not(readout)
+        readout = cv2.fastNlMeansDenoising(readout, None, 9, 13)
+        _, readout = cv2.threshold(readout, 180, 255, cv2.THRESH_BINARY)
+        return cv2.blur(readout, (4, 2))
+
+    def request_weight(self):
+        """
+            Captures the weight readout and starts reading it in the
+            background. Returns a future for the text
             """
-        # Find the current and total weight
         screenshot = utils.take_screenshot(False)
         weight = self.get_ui_element('weight', screenshot)
         weight = screenshot[weight[1]:(weight[1] + 12), (weight[0] + 40):(weight[0] + 84)]
+        return utils.read_text_async(weight, self.prepare_readout)
 
-        # Resize and parse the image to a string
-        weight = cv2.resize(weight, (0, 0), fx=3, fy=3)
-        weight = cv2.cvtColor(weight, cv2.COLOR_BGR2GRAY)
-        weight = cv2.bitwise_not(weight)
-        weight = cv2.fastNlMeansDenoising(weight, None, 9, 13)
-        _, weight = cv2.threshold(weight, 180, 255, cv2.THRESH_BINARY)
-        weight = cv2.blur(weight, (4, 2))
+    def get_weight(self, request=None):
+        """
+            Gets the player's current and max weight, from an earlier
+            request if one is given
+            """
+        if request is None:
+            request = self.request_weight()
 
+        # Wait for the image to be parsed to a string
         weight_text = ''
         try:
-            weight_text = pytesseract.image_to_string(weight, config=utils.TESSERACT_CONF)
+            weight_text = request.result()
         except UnicodeDecodeError:
             utils.log("SEVERE", "Tesseract failed to parse player weight from screenshot")
             utils.quit_game()
@@ -109,26 +110,28 @@ class UserInterface:
         current_weight, max_weight = weight_text.split("/")[0::1]
         return int(current_weight), int(max_weight)
 
-    def get_health(self):
+    def request_health(self):
         """
-            Gets the player's current health
+            Captures the health readout and starts reading it in the
+            background. Returns a future for the text
             """
-        # Reduce the screenshot to include only the player's health
         screenshot = utils.take_screenshot(False)
         health = self.get_ui_element('health', screenshot)
         health = screenshot[health[1]:(health[1] + 12), (health[0] + 36):(health[0] + 92)]
+        return utils.read_text_async(health, self.prepare_readout)
 
-        # Resize and parse the image to a string
-        health = cv2.resize(health, (0, 0), fx=3, fy=3)
-        health = cv2.cvtColor(health, cv2.COLOR_BGR2GRAY)
-        health = cv2.bitwise_not(health)
-        health = cv2.fastNlMeansDenoising(health, None, 9, 13)
-        _, health = cv2.threshold(health, 180, 255, cv2.THRESH_BINARY)
-        health = cv2.blur(health, (4, 2))
+    def get_health(self, request=None):
+        """
+            Gets the player's current health, from an earlier request if
+            one is given
+            """
+        if request is None:
+            request = self.request_health()
 
+        # Wait for the image to be parsed to a string
         health_text = ''
         try:
-            health_text = pytesseract.image_to_string(health, config=utils.TESSERACT_CONF)
+            health_text = request.result()
         except UnicodeDecodeError:
             utils.log("SEVERE", "Tesseract failed to parse player health from screenshot")
             utils.quit_game()
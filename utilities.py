@@ -1,25 +1,43 @@
 """
     A collection of useful utility functions
     """
-import datetime
 from time import sleep
 import numpy as np
-import pyautogui
 import cv2
-import pytesseract
+import glyphs
+import ocr
+from frame_cache import FRAMES
+from actions import INPUT
+from logger import LOGGER
 
 NORMALIZATION_CONSTANT = 3156
 TESSERACT_CONF = "--psm 6 -c tessedit_char_whitelist=0123456789"
 
-def log(severity, string):
+def log(severity, string, **fields):
     """
-        Prints a log message prepended with the date and time
+        Logs a message prepended with the date and time. The message is
+        only queued, it is printed and written to the log file in the
+        background. Extra fields, e.g. timings, are kept in JSON logs
         """
-    output = F"{datetime.datetime.now()}: {severity}: {string}"
-    print(output)
+    LOGGER.log(severity, string, **fields)
 
-    with open("log.txt", "a") as log_file:
-        log_file.write(output+"\n")
+def read_text(image, preprocess, config=TESSERACT_CONF):
+    """
+        Reads fixed-font text from an unscaled crop. The glyph recognizer is
+        tried first, Tesseract reads the preprocessed crop when the
+        recognizer is not confident
+        """
+    text = glyphs.read(image)
+    if text is None:
+        text = ocr.image_to_string(preprocess(image), config)
+    return text
+
+def read_text_async(image, preprocess, config=TESSERACT_CONF):
+    """
+        Starts reading a crop in the background like read_text, returns a
+        future for the text
+        """
+    return ocr.submit(read_text, image, preprocess, config)
 
 def bring_game_to_foreground():
     """
@@ -28,22 +46,19 @@ def bring_game_to_foreground():
     screenshot = take_screenshot(False)
 
     # Look for game icon
-    icon_template = cv2.imread('./ui_elements/icon.png')
-    result = cv2.matchTemplate(screenshot, icon_template, cv2.TM_CCORR_NORMED)
+    result = match_template(screenshot, 'ui_elements/icon')
     _, max_val, _, max_loc = cv2.minMaxLoc(result)
 
     # Found game icon with high confidence
     if max_val > 0.9:
         click_at = (max_loc[0] + 12, max_loc[1] + 12)
         log("INFO", F"Found icon, launching game")
-        pyautogui.moveTo(click_at[0], click_at[1], 0.15)
-        pyautogui.click()
+        INPUT.click(click_at[0], click_at[1])
         sleep(1)
 
         # If backpack is found then the game is open
         screenshot = take_screenshot(False)
-        backpack_template = cv2.imread('./ui_elements/backpack.png')
-        result = cv2.matchTemplate(screenshot, backpack_template, cv2.TM_CCORR_NORMED)
+        result = match_template(screenshot, 'ui_elements/backpack')
         _, max_val, _, _ = cv2.minMaxLoc(result)
 
         errors = 0
@@ -51,7 +66,7 @@ def bring_game_to_foreground():
             sleep(1)
             # Check for backpack. If foundmeans game is open
             screenshot = take_screenshot(False)
-            result = cv2.matchTemplate(screenshot, backpack_template, cv2.TM_CCORR_NORMED)
+            result = match_template(screenshot, 'ui_elements/backpack')
             _, max_val, _, _ = cv2.minMaxLoc(result)
             errors += 1
 
@@ -60,8 +75,7 @@ def bring_game_to_foreground():
                 quit_game()
 
     # Look for CMD icon
-    cmd_template = cv2.imread('./ui_elements/cmd.png')
-    result = cv2.matchTemplate(screenshot, cmd_template, cv2.TM_CCORR_NORMED)
+    result = match_template(screenshot, 'ui_elements/cmd')
     _, max_val, _, max_loc = cv2.minMaxLoc(result)
 
     # Found CMD icon with high confidence
@@ -80,26 +94,34 @@ def quit_game():
         """
     bring_game_to_foreground()
     log("SEVERE", "Quitting game\n\n\n\n")
-    pyautogui.hotkey('alt', 'x')
+    INPUT.hotkey('alt', 'x')
     raise SystemExit
 
-def take_screenshot(grayscale=True):
+def take_screenshot(grayscale=True, region=None):
     """
-        Returns a screenshot of the game
+        Returns a screenshot of the game, or only a region of it given by
+        name (see capture.REGIONS) or as (x, y, width, height) relative to
+        the game window. The frame is shared with every other caller until
+        an input event is sent or it goes stale
         """
-    pyautogui.screenshot("screenshot.png")
-    screenshot = cv2.imread("screenshot.png")
-    if grayscale:
-        screenshot = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-    return screenshot
+    # Queued input has to reach the game before it is looked at
+    INPUT.flush()
 
-def get_macro_window(image):
-    # Load macro template and convert it to grayscale
-    template = cv2.imread('./ui_elements/macro.png')
-    template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+    if region is not None:
+        return FRAMES.get_region(region, grayscale)
+    return FRAMES.get_frame(grayscale)
+
+def match_template(image, template_name, region=None):
+    """
+        Match a named template against an image, optionally restricted to an
+        (x, y, width, height) region. Matches against the current frame
+        are memoized so repeated searches are free
+        """
+    return FRAMES.match_template(image, template_name, region)
 
+def get_macro_window(image):
     # Find macro template
-    result = cv2.matchTemplate(image, template, cv2.TM_CCORR_NORMED)
+    result = match_template(image, 'ui_elements/macro')
     _, max_val, _, max_loc = cv2.minMaxLoc(result)
 
     # Unlikely there is a macro check occurring
@@ -109,19 +131,26 @@ def get_macro_window(image):
     log("INFO", "A macro challenge is occurring")
     return max_loc
 
-def resolve_macro_check():
+def prepare_question(question):
     """
-        Checks for and resolves a macro challenge
+        Resize and invert the macro question for Tesseract
         """
-    # Sleep for a moment to give the window time to open
-    sleep(0.3)
+    question = cv2.resize(question, (0, 0), fx=3, fy=3)
+    question = cv2.blur(question, (3, 1))
+    return cv2.bitwise_not(question)
 
+def resolve_macro_check():
+    """
+        Checks for and resolves a macro challenge. Returns where the
+        challenge window was found on screen, or None if there was none
+        """
     # Move mouse to a neutral position that won't obstruct template matching
-    pyautogui.moveTo(400, 400)
+    INPUT.neutral()
     image = take_screenshot()
 
     attempts = 0
     window_loc = get_macro_window(image)
+    found_at = window_loc
     while not window_loc is None:
         # A macro check is occurring, find the question
         question = image[window_loc[1]:(window_loc[1] + 12),
@@ -129,11 +158,7 @@ def resolve_macro_check():
 
         # Parse the macro question from the image
         try:
-            # Resize and parse the image to a string
-            question = cv2.resize(question, (0, 0), fx=3, fy=3)
-            question = cv2.blur(question, (3, 1))
-            question = cv2.bitwise_not(question)
-            question = pytesseract.image_to_string(question, config=TESSERACT_CONF)
+            question = read_text(question, prepare_question)
         except UnicodeDecodeError:
             log("SEVERE", "Tesseract failed to parse macro question from screenshot")
             quit_game()
@@ -142,24 +167,19 @@ def resolve_macro_check():
         expression, consequent = question.split('=')[0::1]
         term1, term2 = expression.split('+')[0::1]
 
-        # Load the template of the button to press
-        button_template = 'no.png'
+        # Pick the template of the button to press
+        button_template = 'ui_elements/no'
         if int(term1) + int(term2) == int(consequent):
-            button_template = 'yes.png'
-
-        # Load button template and convert it to grayscale
-        button_template = cv2.imread('./ui_elements/' + button_template)
-        button_template = cv2.cvtColor(button_template, cv2.COLOR_BGR2GRAY)
+            button_template = 'ui_elements/yes'
 
         # Find button template
-        result = cv2.matchTemplate(image, button_template, cv2.TM_CCORR_NORMED)
+        result = match_template(image, button_template)
         _, max_val, _, max_loc = cv2.minMaxLoc(result)
 
         # Found the button with high confidence
         if max_val > 0.9:
             # Click the "yes" or "no" button to resolve the macro check
-            pyautogui.moveTo(max_loc[0] + 14, max_loc[1] + 7, 0.15)
-            pyautogui.click()
+            INPUT.click(max_loc[0] + 14, max_loc[1] + 7)
             sleep(1)
 
         # If macro resolution fails after this many attempts, something is clearly wrong
@@ -174,7 +194,9 @@ def resolve_macro_check():
         log("INFO", "Resolved macro challenge")
 
         # Move mouse to a neutral position that won't obstruct template matching
-        pyautogui.moveTo(400, 400)
+        INPUT.neutral()
+
+    return found_at
 
 def debug_show_image(image):
     """
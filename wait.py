@@ -0,0 +1,93 @@
+"""
+    This module waits for the game to finish an action by polling a small
+    region of the screen for a visual condition, instead of sleeping for
+    the worst-case time
+    """
+from time import sleep
+from timeit import default_timer as timer
+import cv2
+import numpy as np
+import utilities as utils
+import capture
+from frame_cache import FRAMES
+
+# Seconds before the first poll, the delay grows by BACKOFF after every
+# poll up to MAX_DELAY
+FIRST_DELAY = 0.02
+BACKOFF = 1.5
+MAX_DELAY = 0.25
+
+# Mean absolute pixel difference for a region to count as changed
+MIN_CHANGE = 4
+
+
+def wait_until(condition, timeout):
+    """
+        Polls a condition on new frames until it returns a truthy value or
+        timeout seconds pass. Returns the last value of the condition
+        """
+    deadline = timer() + timeout
+    delay = FIRST_DELAY
+    while True:
+        # Every poll has to look at a new frame
+        FRAMES.invalidate()
+        result = condition()
+        if result:
+            return result
+
+        remaining = deadline - timer()
+        if remaining <= 0:
+            return result
+        sleep(min(delay, remaining))
+        delay = min(delay * BACKOFF, MAX_DELAY)
+
+
+def region_changed(region):
+    """
+        Condition that holds once a named or (x, y, width, height) region
+        looks different from when the condition was created
+        """
+    before = utils.take_screenshot(region=region).astype(np.int16)
+
+    def condition():
+        return np.mean(np.abs(utils.take_screenshot(region=region) - before)) > MIN_CHANGE
+    return condition
+
+
+def find_template(template_name, region=None):
+    """
+        Returns the screen location of a template, or None when it is not
+        visible in the named or (x, y, width, height) region. Only the
+        region is captured
+        """
+    image = utils.take_screenshot(False, region)
+    _, max_val, _, max_loc = cv2.minMaxLoc(utils.match_template(image, template_name))
+    if max_val < 0.9:
+        return None
+    if region is not None:
+        x, y, _, _ = capture.screen_region(region)
+        max_loc = (max_loc[0] + x, max_loc[1] + y)
+    return max_loc
+
+
+def template_appeared(template_name, region=None):
+    """
+        Condition that returns the location of a template once it is visible
+        """
+    return lambda: find_template(template_name, region)
+
+
+def template_vanished(template_name, region=None):
+    """
+        Condition that holds once a template is no longer visible
+        """
+    return lambda: find_template(template_name, region) is None
+
+
+def item_count_changed(backpack, item):
+    """
+        Condition that holds once the number of an item in the backpack
+        differs from when the condition was created
+        """
+    before = backpack.count(item)
+    return lambda: backpack.count(item) != before
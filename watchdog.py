@@ -0,0 +1,196 @@
+"""
+    This module watches the screen from background threads, so the control
+    loop only has to read a flag to know whether the game is still in the
+    foreground or a macro challenge has appeared
+"""
+import atexit
+import os
+import threading
+import cv2
+import utilities as utils
+import capture
+import templates
+
+# Seconds between checks
+WATCHDOG_INTERVAL = float(os.environ.get('GAME_AI_WATCHDOG_INTERVAL', 2))
+MACRO_INTERVAL = float(os.environ.get('GAME_AI_MACRO_INTERVAL', 0.2))
+
+# Pixels around the located macro window that are watched, in case it
+# opens slightly elsewhere
+MACRO_MARGIN = 16
+
+# Frames and templates are shrunk by this factor before matching
+DOWNSCALE = 0.5
+
+# What the watchdog can see
+FOREGROUND = 'foreground'
+BACKGROUND = 'background'
+CLOSED = 'closed'
+
+
+def template_visible(image, template):
+    """
+        Returns True when a grayscale template matches an image with high confidence
+        """
+    result = cv2.matchTemplate(image, template, cv2.TM_CCORR_NORMED)
+    return cv2.minMaxLoc(result)[1] > 0.9
+
+
+class Watcher:
+    """
+        Calls scan with a capture backend every interval seconds on a daemon
+        thread, until stopped. A failing scan is logged and retried on the
+        next interval
+        """
+
+    def __init__(self, interval, scan):
+        self.interval = interval
+        self.scan = scan
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+            Start checking in the background
+            """
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+            Stop the background thread
+            """
+        self.stopped.set()
+
+    def run(self):
+        """
+            Check until stopped
+            """
+        # The thread grabs frames with its own backend, capture backends
+        # can't be shared between threads
+        backend = None
+        last_error = None
+        while not self.stopped.wait(self.interval):
+            try:
+                if backend is None:
+                    backend = capture.create_backend()
+                self.scan(backend)
+                last_error = None
+            except Exception as exception:
+                # Log each new failure once, the check keeps running
+                if repr(exception) != last_error:
+                    last_error = repr(exception)
+                    utils.log("SEVERE", F"Background check failed: {last_error}")
+
+
+class ForegroundWatchdog:
+    """
+        Periodically looks for the game icon, shown when the game is not in
+        the foreground, and the CMD icon, shown when it has closed. The
+        latest state is published in state and every change sets an event
+        """
+
+    def __init__(self, interval=WATCHDOG_INTERVAL):
+        self.watcher = Watcher(interval, self.scan)
+        self.state = FOREGROUND
+        self.changed = threading.Event()
+
+        # Shrink the templates once, here, since the registry is not thread safe
+        self.templates = dict()
+        for name, state in (('ui_elements/icon', BACKGROUND), ('ui_elements/cmd', CLOSED)):
+            template = templates.get(name, grayscale=True)
+            self.templates[state] = cv2.resize(template, (0, 0), fx=DOWNSCALE, fy=DOWNSCALE,
+                                               interpolation=cv2.INTER_AREA)
+
+    def start(self):
+        """
+            Start watching in the background
+            """
+        self.watcher.start()
+
+    def check(self, frame):
+        """
+            Returns the state of the game seen in a screen capture
+            """
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame = cv2.resize(frame, (0, 0), fx=DOWNSCALE, fy=DOWNSCALE, interpolation=cv2.INTER_AREA)
+
+        # The icon is checked first, as the original foreground check did
+        for state in (BACKGROUND, CLOSED):
+            if template_visible(frame, self.templates[state]):
+                return state
+        return FOREGROUND
+
+    def scan(self, backend):
+        """
+            Check the game's state, flagging a change
+            """
+        state = self.check(backend.grab())
+        if state != self.state:
+            self.state = state
+            self.changed.set()
+
+    def state_changed(self):
+        """
+            Returns True once for every change of state since the last call
+            """
+        if not self.changed.is_set():
+            return False
+        self.changed.clear()
+        return True
+
+
+class MacroWatcher:
+    """
+        Looks for the macro challenge window. Until the window has been
+        located the whole screen is searched at reduced size, afterwards
+        only the region around it. The challenge event is set for as long
+        as the window is visible
+        """
+
+    def __init__(self, interval=MACRO_INTERVAL):
+        self.watcher = Watcher(interval, self.scan)
+        self.challenge = threading.Event()
+
+        # Region around the window, relative to the game window, once located
+        self.region = None
+
+        # Shrink the template once, here, since the registry is not thread safe
+        self.template = templates.get('ui_elements/macro', grayscale=True)
+        self.small_template = cv2.resize(self.template, (0, 0), fx=DOWNSCALE, fy=DOWNSCALE,
+                                         interpolation=cv2.INTER_AREA)
+
+    def start(self):
+        """
+            Start watching in the background
+            """
+        self.watcher.start()
+
+    def locate(self, window_loc):
+        """
+            Watch only the region around the window, given where it was
+            found on screen
+            """
+        height, width = self.template.shape
+        self.region = (window_loc[0] - capture.GAME_ORIGIN[0] - MACRO_MARGIN,
+                       window_loc[1] - capture.GAME_ORIGIN[1] - MACRO_MARGIN,
+                       width + 2 * MACRO_MARGIN, height + 2 * MACRO_MARGIN)
+
+    def scan(self, backend):
+        """
+            Check for the challenge window
+            """
+        region = self.region
+        if region is None:
+            frame = cv2.cvtColor(backend.grab(), cv2.COLOR_BGR2GRAY)
+            frame = cv2.resize(frame, (0, 0), fx=DOWNSCALE, fy=DOWNSCALE, interpolation=cv2.INTER_AREA)
+            visible = template_visible(frame, self.small_template)
+        else:
+            frame = cv2.cvtColor(backend.grab(capture.screen_region(region)), cv2.COLOR_BGR2GRAY)
+            visible = template_visible(frame, self.template)
+
+        if visible:
+            self.challenge.set()
+        else:
+            self.challenge.clear()